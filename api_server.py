@@ -0,0 +1,222 @@
+"""
+On-demand playlist API.
+
+    GET  /playlist?city=Mumbai&limit=25                  ranked track ids for the city's weather
+    POST /playlist?city=Mumbai&limit=25&playlist_id=...  same, and write them to the playlist
+    GET  /health
+
+Runs the weather -> mood -> candidates -> ranking pipeline from app.py on a
+worker pool behind an asyncio HTTP server. Identical requests that arrive
+while one is being computed share its result, and weather readings and
+ranked pools are cached, so many clients asking for the same city or mood
+cost one computation. Track ids come from the per-mood ranked pools, so
+`limit` is capped at MOOD_POOL_SIZE.
+
+    python api_server.py    # listens on API_HOST:API_PORT (default 127.0.0.1:8080)
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import app
+
+MAX_LIMIT = app.MOOD_POOL_SIZE
+MAX_HEADER_BYTES = 16 * 1024
+# Bodies are drained, not used; anything larger is refused instead of buffered
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PlaylistService:
+    """
+    Runs the blocking pipeline on a thread pool and coalesces identical
+    in-flight requests: the first caller starts the computation and every
+    caller with the same (city, limit, playlist_id) awaits the same future.
+    """
+
+    def __init__(self, generate, max_workers=8):
+        self.generate = generate
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api")
+        self._inflight = {}
+        self.stats = {"requests": 0, "computed": 0, "coalesced": 0}
+
+    async def get(self, city, limit, playlist_id=None):
+        key = (city.strip().lower(), limit, playlist_id)
+        self.stats["requests"] += 1
+        future = self._inflight.get(key)
+        if future is None:
+            self.stats["computed"] += 1
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self.generate, city.strip(), limit, playlist_id)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # shield() so one client disconnecting does not cancel the others' result
+        return await asyncio.shield(future)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PlaylistApi:
+    """Minimal HTTP/1.1 front end (keep-alive, GET/POST, JSON responses) on asyncio streams"""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                     {"error": "headers too large"}, keep_alive=False)
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                # Request bodies are not used; drain them so keep-alive stays in sync
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, {"error": "invalid Content-Length"},
+                                     keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                     {"error": f"request body over {MAX_BODY_BYTES} bytes"}, keep_alive=False)
+                    break
+                if length:
+                    try:
+                        await reader.readexactly(length)
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        break
+
+                keep_alive = headers.get("connection", "").lower() != "close" and "HTTP/1.1" in request_line
+                status, body = await self.dispatch(request_line)
+                await self._send(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def dispatch(self, request_line):
+        started = time.perf_counter()
+        route = "unknown"
+        try:
+            try:
+                method, target, _ = request_line.split(" ", 2)
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "malformed request line")
+            url = urlsplit(target)
+            route = url.path
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+            if url.path == "/health":
+                status, body = HTTPStatus.OK, {"status": "ok", **self.service.stats}
+            elif url.path == "/playlist":
+                if method not in ("GET", "POST"):
+                    raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "use GET or POST")
+                status, body = HTTPStatus.OK, await self.playlist(method, query)
+            else:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"no route for {url.path}")
+        except ApiError as e:
+            status, body = e.status, {"error": str(e)}
+        except Exception as e:
+            print(f"API error handling '{request_line}': {e}")
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+
+        if route not in ("/playlist", "/health"):
+            route = "other"
+        app.metrics.inc("api_requests_total", route=route, status=int(status))
+        app.metrics.observe("api_request_seconds", time.perf_counter() - started, route=route)
+        return status, body
+
+    async def playlist(self, method, query):
+        city = (query.get("city") or "").strip()
+        if not city:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "city is required")
+        try:
+            limit = int(query.get("limit", 25))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be an integer")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"limit must be between 1 and {MAX_LIMIT}")
+
+        playlist_id = None
+        if method == "POST":
+            playlist_id = query.get("playlist_id")
+            if not playlist_id:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "playlist_id is required to write a playlist")
+
+        result = await self.service.get(city, limit, playlist_id)
+        if result.get("error"):
+            raise ApiError(result["status"], result["error"])
+        return result
+
+    @staticmethod
+    async def _send(writer, status, body, keep_alive):
+        payload = json.dumps(body).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        try:
+            writer.write(head.encode("latin-1") + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def serve(host, port, service):
+    api = PlaylistApi(service)
+    server = await asyncio.start_server(api.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Playlist API listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    mood_pools = app.create_mood_pools(app.open_catalog())
+    mood_pools.start()
+
+    def generate(city, limit, playlist_id):
+        return app.generate_playlist(mood_pools, city, limit, playlist_id)
+
+    service = PlaylistService(generate, max_workers=app.API_WORKERS)
+    app.metrics.add_collector(lambda: [
+        ("api_pipeline_runs_total", "counter", {"result": "computed"}, service.stats["computed"]),
+        ("api_pipeline_runs_total", "counter", {"result": "coalesced"}, service.stats["coalesced"]),
+    ])
+    app.start_metrics_server()
+    try:
+        asyncio.run(serve(app.API_HOST, app.API_PORT, service))
+    except KeyboardInterrupt:
+        print("Stopping playlist API...")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
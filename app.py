@@ -1,13 +1,28 @@
+import argparse
 import os
+import sys
 import time
 import json
-import numpy as np
-import requests
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
+from scheduler import JobScheduler, load_jobs
+from classifier import HindiTrackClassifier
+from playlist_sync import read_playlist_state, sync_playlist_items
+from playlist_miner import iter_playlist_tracks
+from playlist_cache import PlaylistCache
+from ratelimit import PriorityRateLimiter, PRIORITY_READ, priority_scope
+from mood_resolver import MoodResolver
+from metrics import Metrics, SIZE_BUCKETS
+from mood_pools import MoodPoolStore, select_for_playlist
+from prewarm import Prewarmer
+from state_snapshot import StateSnapshotter
+from track_record import TopTracks, TrackRecord
+
+# Modules that pull in numpy, requests or spotipy (scoring, catalog, feature_index,
+# weather, audio_features, spotify_auth) are imported where they are first used,
+# so `--help`, `--once` and `--dry-run` runs only load what they touch
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +35,51 @@ SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
 PLAYLIST_ID = os.getenv("PLAYLIST_ID")
 CITY = os.getenv("CITY", "Rohtak")
 UPDATE_INTERVAL = int(os.getenv("UPDATE_INTERVAL", "3600"))  # in seconds, default 1 hour
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "8"))  # parallel searches / playlist fetches
+AUDIO_FEATURES_CONCURRENCY = int(os.getenv("AUDIO_FEATURES_CONCURRENCY", "4"))  # parallel audio-feature batches
+PLAYLIST_SYNC_MODE = os.getenv("PLAYLIST_SYNC_MODE", "diff")  # "diff" (minimal edits) or "replace"
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))  # refresh this many seconds before expiry
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "10"))  # requests per second, shared by all Spotify calls
+SPOTIFY_BURST = int(os.getenv("SPOTIFY_BURST", "10"))  # requests allowed back to back before throttling
+CATALOG_PATH = os.getenv("CATALOG_PATH", "track_catalog.db")  # set empty to disable the local catalog
+PLAYLIST_CHECK_INTERVAL = int(os.getenv("PLAYLIST_CHECK_INTERVAL", "0"))  # seconds a mined playlist is reused without a snapshot check
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))  # seconds a weather reading stays fresh
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "10"))  # seconds
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL")  # OpenWeatherMap API root override, e.g. a local stand-in server
+
+# Multi-playlist scheduler (used instead of CITY / PLAYLIST_ID when JOBS_FILE is set)
+JOBS_FILE = os.getenv("JOBS_FILE")
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+CANDIDATE_CACHE_TTL = int(os.getenv("CANDIDATE_CACHE_TTL", "1800"))  # seconds a per-mood ranked pool is reused
+MOOD_POOL_SIZE = int(os.getenv("MOOD_POOL_SIZE", "50"))  # ranked tracks kept per mood; playlists pick from these
+PLAYLIST_SIZE = 25
+MAX_TRACKS_PER_ARTIST = int(os.getenv("MAX_TRACKS_PER_ARTIST", "3"))  # per ranked list (pool or playlist); 0 = no cap
+# Prepare scheduled updates this many seconds before they are due (forecast moods'
+# pools built, current weather refreshed) so the update itself is only the write; 0 disables
+PREWARM_HORIZON = int(os.getenv("PREWARM_HORIZON", "900"))
+# Sharding: workers (processes or hosts) started with the same JOBS_FILE and LEASE_DB split
+# the jobs between them by leasing them from that SQLite file; unset runs every job here
+LEASE_DB = os.getenv("LEASE_DB")
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "60"))  # a dead worker's jobs move to others after this
+WORKER_ID = os.getenv("WORKER_ID")  # default: host:pid
+
+# Warm restarts: caches (weather, mood pools, Hindi verdicts, playlist state) and each playlist's
+# last update are saved here every STATE_SNAPSHOT_INTERVAL seconds and reloaded at startup,
+# so a restart within the TTLs makes no API calls; set empty to disable
+STATE_SNAPSHOT_PATH = os.getenv("STATE_SNAPSHOT_PATH", "app_state.snapshot")
+STATE_SNAPSHOT_INTERVAL = int(os.getenv("STATE_SNAPSHOT_INTERVAL", "60"))
+# Where mood pools come from: "search" (keyword search) or "features" (nearest neighbours
+# to the mood's audio targets among catalog tracks, falling back to search)
+POOL_SOURCE = os.getenv("POOL_SOURCE", "search")
+
+# Metrics endpoint (Prometheus text format at /metrics); leave METRICS_PORT empty to disable
+METRICS_PORT = int(os.getenv("METRICS_PORT") or 0)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# On-demand playlist API (api_server.py)
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_WORKERS = int(os.getenv("API_WORKERS", "8"))  # pipeline runs in parallel
 
 # Comprehensive list of popular Hindi/Bollywood artists for better filtering
 HINDI_ARTISTS = [
@@ -31,6 +91,12 @@ HINDI_ARTISTS = [
     "Darshan Raval", "Shilpa Rao", "Vishal Mishra", "Tulsi Kumar", "Dhvani Bhanushali"
 ]
 
+# Keywords in track / album names that suggest a Hindi track
+HINDI_TRACK_KEYWORDS = ["bollywood", "hindi", "desi", "bhangra", "punjabi",
+                        "indian", "dil", "pyaar", "ishq", "sanam", "tum",
+                        "tera", "mera", "tu ", "main", "jaan", "kyun", "hai"]
+HINDI_ALBUM_KEYWORDS = ["bollywood", "hindi", "desi", "indian"]
+
 # Popular Hindi Music Playlists on Spotify for mining additional tracks
 HINDI_PLAYLIST_IDS = [
     "37i9dQZF1DX0XUoa6ej4Ks",  # Bollywood Butter
@@ -202,31 +268,36 @@ WEATHER_MOOD_MAP = {
 }
 
 
+# Stage latencies, API call counts, cache hit rates and pool sizes for the whole process
+metrics = Metrics()
+
+# Guards the lazily created process-wide clients below
+lazy_init_lock = threading.Lock()
+
+# Shared by every caller so repeated lookups for a city within the TTL cost nothing.
+# Created on first use; run_scheduler swaps in the bulk provider.
+weather_provider = None
+
+
+def get_weather_provider():
+    global weather_provider
+    with lazy_init_lock:
+        if weather_provider is None:
+            from weather import WeatherProvider, OPENWEATHER_API
+            weather_provider = WeatherProvider(WEATHER_API_KEY, ttl=WEATHER_CACHE_TTL,
+                                               timeout=(3.05, WEATHER_TIMEOUT),
+                                               base_url=f"{WEATHER_BASE_URL or OPENWEATHER_API}/weather")
+        return weather_provider
+
+
 def get_current_weather(city):
-    """Get current weather for a city with enhanced data"""
-    url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid={WEATHER_API_KEY}&units=metric"
+    """Get current weather for a city with enhanced data (cached per city)"""
+    with metrics.stage("weather"):
+        return get_weather_provider().get(city)
 
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-
-        data = response.json()
-        weather_desc = data["weather"][0]["description"].lower()
-
-        return {
-            "description": weather_desc,
-            "main": data["weather"][0]["main"].lower(),
-            "temperature": data["main"]["temp"],
-            "humidity": data["main"]["humidity"],
-            "wind_speed": data["wind"]["speed"],
-            "clouds": data.get("clouds", {}).get("all", 0),
-            "rain": data.get("rain", {}).get("1h", 0) if "rain" in data else 0,
-            "time": datetime.now().hour,
-            "raw_data": data  # Store raw data for detailed analysis
-        }
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching weather: {e}")
-        return None
+
+# WEATHER_MOOD_MAP compiled into lookup tables and threshold rules once at startup
+mood_resolver = MoodResolver(WEATHER_MOOD_MAP)
 
 
 def get_enhanced_mood_from_weather(weather_data):
@@ -234,372 +305,455 @@ def get_enhanced_mood_from_weather(weather_data):
     Enhanced mood determination based on detailed weather analysis
     Incorporates multiple parameters and normalized values
     """
-    if not weather_data:
-        return WEATHER_MOOD_MAP["default"]
+    return mood_resolver.resolve(weather_data)
 
-    weather_desc = weather_data["description"]
-    weather_main = weather_data["main"]
-    temp = weather_data["temperature"]
-    clouds = weather_data["clouds"]
-    rain_amount = weather_data["rain"]
-    time_of_day = weather_data["time"]
-
-    # Check for exact weather description match
-    for key in WEATHER_MOOD_MAP:
-        if key in weather_desc:
-            print(f"Weather match found: {key}")
-            return WEATHER_MOOD_MAP[key]
-
-    # Check for weather main type
-    if "thunderstorm" in weather_main:
-        return WEATHER_MOOD_MAP["thunderstorm"]
-    elif "snow" in weather_main:
-        return WEATHER_MOOD_MAP["snow"] if rain_amount > 1 else WEATHER_MOOD_MAP["light snow"]
-    elif "rain" in weather_main:
-        if rain_amount > 7:
-            return WEATHER_MOOD_MAP["heavy rain"]
-        elif rain_amount > 2.5:
-            return WEATHER_MOOD_MAP["moderate rain"]
-        else:
-            return WEATHER_MOOD_MAP["light rain"]
-    elif "drizzle" in weather_main:
-        return WEATHER_MOOD_MAP["light rain"]
-    elif "mist" in weather_main or "fog" in weather_main:
-        return WEATHER_MOOD_MAP["mist"]
-    elif "clouds" in weather_main:
-        if clouds > 80:
-            return WEATHER_MOOD_MAP["overcast clouds"]
-        elif clouds > 50:
-            return WEATHER_MOOD_MAP["broken clouds"]
-        else:
-            return WEATHER_MOOD_MAP["scattered clouds"]
-    elif "clear" in weather_main:
-        if temp > 30:
-            return WEATHER_MOOD_MAP["hot"]
-        elif temp < 10:
-            return WEATHER_MOOD_MAP["cold"]
-        else:
-            return WEATHER_MOOD_MAP["clear sky"] if clouds < 10 else WEATHER_MOOD_MAP["few clouds"]
 
-    # Temperature-based fallback
-    if temp > 30:
-        return WEATHER_MOOD_MAP["hot"]
-    elif temp < 10:
-        return WEATHER_MOOD_MAP["cold"]
+def get_moods_for_weather_batch(weather_records):
+    """Resolve many weather observations (cities, forecast hours) to mood entries in one call"""
+    return mood_resolver.moods(mood_resolver.resolve_batch(weather_records))
 
-    # Default mood if no match
-    return WEATHER_MOOD_MAP["default"]
+
+def predict_moods(jobs):
+    """
+    Moods each (city, when) pair is expected to have at unix time `when`: the
+    forecast slot covering it (when forecasts are loaded) and the mood of the
+    city's latest reading, through the same rules as get_enhanced_mood_from_weather.
+    The latest readings of all the cities are resolved in one batch.
+    """
+    table = getattr(weather_provider, "table", None)
+    if table is None:
+        return [[] for _ in jobs]
+    from weather import FORECAST_STEP
+    records = {}
+    for city, _ in jobs:
+        key = city.strip().lower()
+        if key not in records:
+            records[key] = table.record(city)
+    known = [key for key, record in records.items() if record]
+    current = dict(zip(known, get_moods_for_weather_batch(records[key] for key in known))) if known else {}
+
+    predictions = []
+    for city, when in jobs:
+        _, descriptions, mains, temperatures, clouds, rain = table.forecast_columns(city, when - FORECAST_STEP + 1, when + 1)
+        moods = mood_resolver.moods(mood_resolver.resolve_columns(descriptions, mains, temperatures, clouds, rain))
+        if city.strip().lower() in current:
+            moods.append(current[city.strip().lower()])
+        predictions.append(moods)
+    return predictions
+
+
+# Every Spotify request in the process shares this budget; playlist writes
+# jump the queue ahead of searches and playlist mining
+spotify_limiter = PriorityRateLimiter(SPOTIFY_RATE_LIMIT, SPOTIFY_BURST)
+
+# One long-lived OAuth manager, token cache and HTTP pool for the whole process.
+# Created on first use so importing app.py does not require credentials.
+spotify_session = None
+
+
+def get_spotify_session():
+    global spotify_session
+    with lazy_init_lock:
+        if spotify_session is None:
+            from spotify_auth import SpotifySession
+            spotify_session = SpotifySession(
+                SPOTIFY_CLIENT_ID,
+                SPOTIFY_CLIENT_SECRET,
+                SPOTIFY_REDIRECT_URI,
+                cache_path=".spotify_token_cache",
+                refresh_margin=TOKEN_REFRESH_MARGIN,
+                limiter=spotify_limiter,
+            )
+        return spotify_session
 
 
 def authenticate_spotify():
-    """Authenticate with Spotify API with improved error handling"""
-    scope = "playlist-modify-public playlist-modify-private user-read-private"
+    """
+    Return an authenticated Spotify client with improved error handling.
+    The first call logs in and verifies the connection; later calls reuse the
+    same client and only refresh the token when it is close to expiring.
+    """
     try:
-        # Use cache handling with a clear name
-        cache_path = ".spotify_token_cache"
-
-        auth_manager = SpotifyOAuth(
-            client_id=SPOTIFY_CLIENT_ID,
-            client_secret=SPOTIFY_CLIENT_SECRET,
-            redirect_uri=SPOTIFY_REDIRECT_URI,
-            scope=scope,
-            cache_path=cache_path,
-            open_browser=True  # Ensure this matches your environment
-        )
+        with metrics.stage("auth"):
+            session = get_spotify_session()
+            if session.client is None:
+                sp = session.connect()
+                print(f"Successfully authenticated as: {session.display_name}")
+                return sp
+            return session.get_client()
+    except Exception as e:
+        print(f"Authentication error: {e}")
+        return None
 
-        # Force token refresh to ensure we have a valid token
-        token_info = auth_manager.get_cached_token()
-        if not token_info or auth_manager.is_token_expired(token_info):
-            print("Getting new token...")
-            auth_manager.get_access_token(as_dict=False)
 
-        # Create Spotify client with the auth manager
-        sp = spotipy.Spotify(auth_manager=auth_manager)
+def auth_stats():
+    """Auth latency and refresh counters for logging"""
+    return dict(get_spotify_session().stats)
 
-        # Test the connection with a simple API call
-        current_user = sp.current_user()
-        print(f"Successfully authenticated as: {current_user['display_name']}")
 
-        return sp
-    except Exception as e:
-        print(f"Authentication error: {e}")
-        return None
+# Built once; shared by every search, playlist pass and job
+hindi_classifier = HindiTrackClassifier(HINDI_ARTISTS, HINDI_TRACK_KEYWORDS, HINDI_ALBUM_KEYWORDS)
 
 
-def get_audio_features_batch(sp, track_ids):
-    """Get audio features with explicit token handling"""
-    if not track_ids:
-        return []
+# Warm-restart snapshot for the long-running modes; sections are restored as components register
+state_snapshot = StateSnapshotter(STATE_SNAPSHOT_PATH, interval=STATE_SNAPSHOT_INTERVAL) if STATE_SNAPSHOT_PATH else None
 
-    if not sp:
-        print("Error: Spotify client is None")
-        return []
+# Last successful write per playlist: {playlist_id: {"city", "mood", "track_ids", "at" (unix time)}}
+last_cycles = {}
+last_cycles_lock = threading.Lock()
 
-    try:
-        # Make sure we have small enough batches
-        batch_size = 20  # Even smaller batch to troubleshoot
-        all_features = []
 
-        # Process in smaller batches with explicit error handling
-        for i in range(0, len(track_ids), batch_size):
-            chunk = track_ids[i:i + batch_size]
-            chunk_ids = ",".join(chunk)
-            print(f"Processing batch {i // batch_size + 1} with {len(chunk)} tracks")
+def record_cycle(playlist_id, city, mood, track_ids):
+    with last_cycles_lock:
+        last_cycles[playlist_id] = {"city": city, "mood": mood, "track_ids": list(track_ids), "at": time.time()}
+    if state_snapshot is not None:
+        state_snapshot.request_save()
 
-            try:
-                # Check that our client still has a valid token
-                if not hasattr(sp, '_auth'):
-                    print("Warning: Spotify client has no auth attribute")
-                    return []
-
-                # Try getting features with explicit token checking
-                features = sp.audio_features(chunk)
-
-                if features:
-                    valid_features = [f for f in features if f]
-                    all_features.extend(valid_features)
-                    print(f"Got {len(valid_features)} valid features from batch")
-                else:
-                    print("No features returned for batch")
-
-            except spotipy.SpotifyException as e:
-                print(f"Spotify API error in batch {i // batch_size + 1}: {e}")
-                if "token" in str(e).lower() or "unauthorized" in str(e).lower():
-                    print("Token seems invalid - stopping processing")
-                    return []
-            except Exception as e:
-                print(f"General error in batch {i // batch_size + 1}: {e}")
 
-        return all_features
+def export_cycles():
+    with last_cycles_lock:
+        return dict(last_cycles)
 
-    except Exception as e:
-        print(f"Error in audio features function: {e}")
-        return []
 
-def is_hindi_track(track):
-    """
-    Enhanced detection of Hindi tracks using multiple signals
-    """
-    if not track:
-        return False
+def restore_cycles(state, elapsed=0):
+    with last_cycles_lock:
+        for playlist_id, cycle in state.items():
+            last_cycles.setdefault(playlist_id, cycle)
+    return len(state)
 
-    # Check artist names against known Hindi artists
-    artists = [artist["name"] for artist in track.get("artists", [])]
 
-    # Direct match with our list of Hindi artists
-    for artist in artists:
-        if any(hindi_artist.lower() in artist.lower() for hindi_artist in HINDI_ARTISTS):
-            return True
+def next_cycle_delay(playlist_id, interval):
+    """Seconds until a playlist is due again after its last recorded write (0 when unknown or overdue)"""
+    with last_cycles_lock:
+        cycle = last_cycles.get(playlist_id)
+    return 0 if cycle is None else max(0, cycle["at"] + interval - time.time())
 
-    # Check track name for Hindi keywords
-    track_name = track.get("name", "").lower()
-    hindi_keywords = ["bollywood", "hindi", "desi", "bhangra", "punjabi",
-                      "indian", "dil", "pyaar", "ishq", "sanam", "tum",
-                      "tera", "mera", "tu ", "main", "jaan", "kyun", "hai"]
 
-    if any(keyword in track_name for keyword in hindi_keywords):
-        return True
+def restore_warm_state(**components):
+    """
+    Add components (objects with export_state / restore_state) to the
+    warm-restart snapshot under the given names, restoring what it holds for them
+    """
+    if state_snapshot is None:
+        return
+    for name, component in components.items():
+        restored = state_snapshot.register(name, component.export_state, component.restore_state)
+        if restored:
+            print(f"Restored {restored} {name} entries from the state snapshot")
+
+
+def is_hindi_track(track):
+    """
+    Enhanced detection of Hindi tracks using multiple signals
+    (artist names, track name keywords, album name keywords)
+    """
+    return hindi_classifier.classify(track)
 
-    # Check if album has Hindi indicators
-    album_name = track.get("album", {}).get("name", "").lower()
-    if any(keyword in album_name for keyword in ["bollywood", "hindi", "desi", "indian"]):
-        return True
 
-    return False
+def filter_hindi_tracks(tracks):
+    """Keep only the Hindi tracks from a list; stored catalog verdicts are used, the rest are classified in one call"""
+    tracks = [track for track in tracks if track]
+    verdicts = [track.get("is_hindi") for track in tracks]
+    unclassified = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    for i, verdict in zip(unclassified, hindi_classifier.classify_many([tracks[i] for i in unclassified])):
+        verdicts[i] = verdict
+    return [track for track, verdict in zip(tracks, verdicts) if verdict]
 
 
-def get_audio_features_batch(sp, track_ids):
-    """Get audio features for multiple tracks at once"""
+def get_audio_features_batch(sp, track_ids, catalog=None):
+    """
+    Get audio features for multiple tracks at once, reusing catalog entries.
+    Returns a list aligned with track_ids (None where no features are available).
+    """
     if not track_ids:
         return []
 
+    if not sp:
+        print("Error: Spotify client is None")
+        return []
+
+    from audio_features import AuthError, fetch_audio_features
     try:
-        # Batch track IDs into chunks of 100 (Spotify API limit)
-        all_features = []
-        for i in range(0, len(track_ids), 100):
-            chunk = track_ids[i:i+100]
-            print(f"Fetching audio features for batch of {len(chunk)} tracks")
-            features = sp.audio_features(chunk)
-            if features:
-                all_features.extend(features)
-        return all_features
-    except spotipy.SpotifyException as e:
+        known = catalog.get_audio_features(track_ids) if catalog else {}
+        to_fetch = [track_id for track_id in track_ids if track_id not in known]
+        if known:
+            print(f"Using {len(known)} cached audio features, fetching {len(to_fetch)}")
+
+        metrics.inc("audio_features_lookups_total", len(known), result="hit")
+        metrics.inc("audio_features_lookups_total", len(to_fetch), result="miss")
+        with metrics.stage("audio_features"):
+            fetched = fetch_audio_features(sp, to_fetch, max_workers=AUDIO_FEATURES_CONCURRENCY)
+        if catalog:
+            catalog.put_audio_features([features for features in fetched if features])
+
+        fetched = {track_id: features for track_id, features in zip(to_fetch, fetched)}
+        return [known.get(track_id) or fetched.get(track_id) for track_id in track_ids]
+    except AuthError as e:
         print(f"Spotify API Error getting audio features: {e}")
-        # Check if token expired
-        if "token" in str(e).lower():
-            print("Token may have expired, try re-authenticating")
-            # You could implement re-authentication here
-        return []
+        print("Token may have expired, try re-authenticating")
+        return [None] * len(track_ids)
     except Exception as e:
         print(f"Error getting audio features: {e}")
-        return []
+        return [None] * len(track_ids)
 
 
 def calculate_track_score(track_features, target_features):
     """
     Calculate a similarity score between track audio features and target features
-    using cosine similarity and weighted feature importance
+    using range-normalized, weighted feature closeness blended with popularity
     """
     if not track_features:
         return 0
 
-    # Extract the relevant features we need
-    track_vector = []
-    target_vector = []
-    weights = []
+    from scoring import build_feature_matrix, score_tracks
+    matrix, popularity = build_feature_matrix([track_features])
+    return float(score_tracks(matrix, popularity, target_features)[0])
 
-    for feature, target_value in target_features["target_values"].items():
-        if feature in track_features and track_features[feature] is not None:
-            feature_range = target_features["ranges"].get(feature, 0.2)
-            weight = target_features["weights"].get(feature, 0.2)
 
-            track_vector.append(track_features[feature])
-            target_vector.append(target_value)
-            weights.append(weight)
+def rank_tracks_by_features(track_ids, features_list, target_features, limit=25):
+    """
+    Rank a whole candidate pool by audio features in one vectorized pass.
+    features_list must be aligned with track_ids (None for tracks without features).
+    """
+    if not track_ids:
+        return []
 
-    if not track_vector:
-        return 0
+    from scoring import rank_pool
+    best, scores = rank_pool(features_list, target_features, limit)
+    return [(track_ids[i], float(scores[i])) for i in best]
 
-    # Convert to numpy arrays
-    track_array = np.array(track_vector).reshape(1, -1)
-    target_array = np.array(target_vector).reshape(1, -1)
-    weights_array = np.array(weights)
 
-    # Calculate weighted cosine similarity
-    similarity = cosine_similarity(track_array, target_array)[0][0]
+def open_catalog(path=CATALOG_PATH):
+    """Open the local track catalog, or return None when it is disabled or unavailable"""
+    if not path:
+        return None
+    try:
+        from catalog import TrackCatalog
+        return TrackCatalog(path)
+    except Exception as e:
+        print(f"Track catalog unavailable ({e}), continuing without it")
+        return None
 
-    # Add popularity factor (scale 0-100 to 0-1)
-    popularity = track_features.get("popularity", 50) / 100
 
-    # Final score is a weighted combination of similarity and popularity
-    final_score = (similarity * 0.7) + (popularity * 0.3)
+def search_tracks(sp, query, catalog=None, limit=20):
+    """Search for tracks, reusing the catalog's copy of the result while it is fresh"""
+    if catalog:
+        cached = catalog.get_query("search", query)
+        metrics.inc("catalog_lookups_total", source="search", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
 
-    return final_score
+    results = sp.search(q=query, type="track", limit=limit, market="IN")
+    items = [item for item in results["tracks"]["items"] if item]
+    if catalog:
+        catalog.put_query("search", query, items, classify=is_hindi_track)
+    return items
 
 
-def search_and_rank_hindi_tracks_alternative(sp, mood_info, limit=25):
-    """Alternative approach without relying on audio_features endpoint"""
-    mood = mood_info["mood"]
-    keywords = mood_info["keywords"]
+# Playlist reads (mined editorial playlists, our own playlists' items) reused while
+# their snapshot_id is unchanged
+playlist_cache = PlaylistCache(check_interval=PLAYLIST_CHECK_INTERVAL)
 
-    all_tracks = []
-    used_track_names = set()
 
-    # Search by each keyword
-    for keyword in keywords:
-        query = f"{keyword}"
-        try:
-            results = sp.search(q=query, type="track", limit=20, market="IN")
+def track_is_hindi(track):
+    """Use the catalog's stored verdict when present, otherwise classify"""
+    verdict = track.get("is_hindi")
+    if verdict is None:
+        return is_hindi_track(track)
+    return verdict
 
-            for item in results["tracks"]["items"]:
-                track_name = item["name"].lower()
 
-                if track_name in used_track_names:
-                    continue
+def gather_candidates(sp, keywords, catalog=None, max_workers=SEARCH_CONCURRENCY):
+    """
+    Run every keyword search concurrently on a bounded thread pool.
+    Returns the results aligned with keywords; a failed search yields None so
+    callers can merge the rest in a fixed order. Playlists are not fetched
+    here: they are mined lazily, page by page with prefetch, and only when
+    the searches leave the selection short.
+    """
+    if not keywords:
+        return []
 
-                if is_hindi_track(item):
-                    # Instead of using audio_features, use track properties directly
-                    # This avoids the problematic endpoint
-                    popularity = item.get("popularity", 50)
-                    explicit = item.get("explicit", False)
-                    duration = item.get("duration_ms", 0) / 1000  # convert to seconds
+    def run(keyword):
+        started = time.perf_counter()
+        try:
+            return search_tracks(sp, keyword, catalog)
+        finally:
+            metrics.observe("candidate_fetch_seconds", time.perf_counter() - started, source="search")
+
+    workers = max(1, min(max_workers, len(keywords)))
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="candidates") as pool:
+        futures = [pool.submit(run, keyword) for keyword in keywords]
+        for keyword, future in zip(keywords, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error searching for '{keyword}': {e}")
+                results.append(None)
+    return results
 
-                    # Simple scoring method without audio features
-                    # Higher popularity is better
-                    score = popularity / 100.0
 
-                    # Penalize extremely short or long tracks slightly
-                    if duration < 60 or duration > 480:
-                        score *= 0.9
+# Playlist mining gives up after this many Hindi candidates per requested track,
+# even when per-artist caps leave the selection short
+MINING_BUDGET_FACTOR = 10
 
-                    # Create a simpler track record
-                    all_tracks.append({
-                        "track": item,
-                        "score": score
-                    })
 
-                    used_track_names.add(track_name)
+def search_and_rank_hindi_tracks_alternative(sp, mood_info, limit=25, catalog=None, candidates=None):
+    """
+    Alternative approach without relying on audio_features endpoint.
 
-                if len(all_tracks) >= limit * 2:
-                    break
+    Candidates stream through a bounded top-`limit` selector that drops
+    near-duplicate titles and caps tracks per artist as they arrive; playlist
+    mining stops once the selection is full and the candidate quota is met
+    (or, when caps keep it short, once the mining budget is spent). Pass a list as `candidates` to
+    collect every Hindi candidate track seen.
+    """
+    mood = mood_info["mood"]
+    keywords = mood_info["keywords"]
+    selector = TopTracks(limit, max_per_artist=MAX_TRACKS_PER_ARTIST)
+    quota = limit * 2
+
+    # Run all keyword searches at once; merge in input order below
+    with metrics.stage("candidates"):
+        search_results = gather_candidates(sp, keywords, catalog)
+    ranking_started = time.perf_counter()
+    mining_seconds = 0.0
+
+    # Search by each keyword; each result list is released once its tracks are parsed
+    for index, keyword in enumerate(keywords):
+        items, search_results[index] = search_results[index], None
+        if items is None:
+            continue
+        try:
+            for item in filter_hindi_tracks(items):
+                # Instead of using audio_features, use track properties directly
+                # This avoids the problematic endpoint
+                popularity = item.get("popularity") or 50
+                duration = (item.get("duration_ms") or 0) / 1000  # convert to seconds
+
+                # Simple scoring method without audio features
+                # Higher popularity is better
+                score = popularity / 100.0
+
+                # Penalize extremely short or long tracks slightly
+                if duration < 60 or duration > 480:
+                    score *= 0.9
+
+                # Keep only what ranking and dedup need, not the full track JSON
+                selector.offer(TrackRecord.from_track(item, score))
+                if candidates is not None:
+                    candidates.append(item)
         except Exception as e:
-            print(f"Error searching for '{keyword}': {e}")
+            print(f"Error processing results for '{keyword}': {e}")
             continue
 
-    # If we don't have enough tracks, try playlists
-    if len(all_tracks) < limit:
+    def enough():
+        if selector.offered >= limit * MINING_BUDGET_FACTOR:
+            return True
+        return selector.full and selector.offered >= quota
+
+    # If we don't have enough tracks, mine playlists page by page until the selection settles
+    if not selector.full:
         print("Not enough tracks found, searching playlists...")
+        mining_started = time.perf_counter()
         for playlist_id in HINDI_PLAYLIST_IDS:
+            tracks = iter_playlist_tracks(sp, playlist_id, cache=playlist_cache)
             try:
-                playlist_tracks = sp.playlist_tracks(playlist_id, limit=20, market="IN")
-
-                for item in playlist_tracks["items"]:
-                    track = item.get("track")
-                    if track:
-                        track_name = track["name"].lower()
-                        if track_name not in used_track_names and is_hindi_track(track):
-                            # Simple scoring
-                            popularity = track.get("popularity", 50)
-                            score = popularity / 100.0
-
-                            all_tracks.append({
-                                "track": track,
-                                "score": score
-                            })
-                            used_track_names.add(track_name)
+                for track in tracks:
+                    if track_is_hindi(track):
+                        # Simple scoring
+                        popularity = track.get("popularity") or 50
+                        selector.offer(TrackRecord.from_track(track, popularity / 100.0))
+                        if candidates is not None:
+                            candidates.append(track)
+
+                    if enough():
+                        break
             except Exception as e:
-                print(f"Error fetching playlist {playlist_id}: {e}")
+                print(f"Error processing playlist {playlist_id}: {e}")
+            finally:
+                tracks.close()
 
-            if len(all_tracks) >= limit * 2:
+            if enough():
                 break
+        mining_seconds = time.perf_counter() - mining_started
+        metrics.record_stage("playlist_mining", mining_seconds)
 
-    # Sort by score
-    all_tracks.sort(key=lambda x: x["score"], reverse=True)
-
-    # Get track IDs
-    best_track_ids = [item["track"]["id"] for item in all_tracks[:limit]]
+    # Best tracks first
+    track_ids = selector.track_ids()
+    metrics.record_stage("ranking", time.perf_counter() - ranking_started - mining_seconds)
+    metrics.observe("candidate_pool_size", selector.offered, buckets=SIZE_BUCKETS, mood=mood)
+    metrics.inc("candidates_suppressed_total", selector.stats["duplicates"], reason="duplicate")
+    metrics.inc("candidates_suppressed_total", selector.stats["artist_capped"], reason="artist_cap")
+    metrics.note(candidate_pool=selector.offered)
 
-    print(f"Found and scored {len(all_tracks)} Hindi tracks using alternative method")
-    return best_track_ids
+    print(f"Found and scored {selector.offered} Hindi tracks using alternative method")
+    return track_ids
 
-def update_playlist(sp, playlist_id, track_ids):
-    """Update a Spotify playlist with new tracks"""
+def update_playlist(sp, playlist_id, track_ids, city=CITY, weather_data=None, guard=None):
+    """
+    Update a Spotify playlist with new tracks.
+
+    Reads the current snapshot once (just its id, name and description when the
+    items from the last read or write are cached), then writes only the removals, reorders and
+    inserts needed to reach the new ranking (PLAYLIST_SYNC_MODE=replace rewrites
+    it in one go instead). Name and description are only rewritten when the mood
+    or weather changed, so the timestamp in the name marks the last mood change.
+    guard() is called before each write and raises when this process may no
+    longer write the playlist (a sharded worker that lost the job's lease).
+    """
     try:
-        # Get playlist details
-        playlist_info = sp.playlist(playlist_id)
+        # Get playlist details (snapshot id, metadata and current items); reading
+        # our own playlist goes ahead of candidate mining in the rate limiter
+        with priority_scope(PRIORITY_READ):
+            state = read_playlist_state(sp, playlist_id, cache=playlist_cache)
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
 
         # Update playlist name to reflect current weather and time
-        weather_data = get_current_weather(CITY)
+        if weather_data is None:
+            weather_data = get_current_weather(city)
         mood_info = get_enhanced_mood_from_weather(weather_data)
 
-        new_name = f"Hindi {mood_info['mood'].title()} Music • {CITY} • {current_time}"
-        new_description = f"Hindi music for {weather_data['description']} weather in {CITY}. Updated on {current_time}."
-
-        # Update playlist metadata
-        sp.playlist_change_details(
-            playlist_id=playlist_id,
-            name=new_name,
-            description=new_description
-        )
-
-        # Clear current playlist
-        sp.playlist_replace_items(playlist_id, [])
+        name_prefix = f"Hindi {mood_info['mood'].title()} Music • {city}"
+        description_prefix = f"Hindi music for {weather_data['description']} weather in {city}."
+        new_name = f"{name_prefix} • {current_time}"
+        new_description = f"{description_prefix} Updated on {current_time}."
 
-        # Add new tracks
-        # Spotify API accepts max 100 tracks per request
-        chunks = [track_ids[i:i + 100] for i in range(0, len(track_ids), 100)]
-        for chunk in chunks:
-            sp.playlist_add_items(playlist_id, chunk)
+        if state["name"].startswith(f"{name_prefix} • ") and state["description"].startswith(description_prefix):
+            new_name = state["name"]
+            print("Mood unchanged, keeping playlist name and description")
+        else:
+            # Update playlist metadata
+            if guard:
+                guard()
+            sp.playlist_change_details(
+                playlist_id=playlist_id,
+                name=new_name,
+                description=new_description
+            )
+
+        if guard:
+            guard()
+        result = sync_playlist_items(sp, playlist_id, track_ids, state=state, mode=PLAYLIST_SYNC_MODE,
+                                     cache=playlist_cache)
+        metrics.inc("playlist_syncs_total", strategy=result["strategy"])
+        metrics.note(sync_strategy=result["strategy"], write_requests=result["requests"])
+        if result["strategy"] == "unchanged":
+            print("Playlist tracks unchanged, nothing to write")
+        else:
+            print(f"Applied {result['strategy']} update in {result['requests']} write requests")
 
         print(f"Successfully updated playlist '{new_name}' with {len(track_ids)} Hindi tracks")
         return True
     except Exception as e:
         print(f"Error updating playlist: {e}")
+        # A partial write leaves the cached items unknown
+        playlist_cache.invalidate(playlist_id)
         return False
 
 
-def generate_weather_report(weather_data):
+def generate_weather_report(weather_data, city=CITY):
     """Generate a detailed weather report"""
     if not weather_data:
         return "Weather data unavailable"
@@ -613,7 +767,7 @@ def generate_weather_report(weather_data):
         "time"] < 17 else "Evening" if 17 <= weather_data["time"] < 21 else "Night"
 
     report = f"""
-Weather Report for {CITY} ({time_of_day}):
+Weather Report for {city} ({time_of_day}):
 • Condition: {description}
 • Temperature: {temp:.1f}°C
 • Humidity: {humidity}%
@@ -622,64 +776,423 @@ Weather Report for {CITY} ({time_of_day}):
 """
     return report
 
-def main():
-    print(f"Starting Enhanced Weather-Based Hindi Music Spotify Playlist Updater for {CITY}")
 
-    # Initial authentication
+def run_update_cycle(sp, city, playlist_id, weather_data, catalog=None, mood_pools=None, dry_run=False,
+                     guard=None):
+    """
+    Pick the mood for the weather, rank candidates and write them to the playlist.
+    With mood_pools the ranking is a lookup in the mood's materialized pool plus
+    a light per-playlist shuffle; without, candidates are searched and ranked here.
+    With dry_run the picked tracks are printed instead of written.
+    """
+    # Print weather report
+    print(generate_weather_report(weather_data, city))
+
+    # Get mood
+    mood_info = get_enhanced_mood_from_weather(weather_data)
+    print(f"Selected mood: {mood_info['mood']}")
+    print(f"Keywords: {', '.join(mood_info['keywords'])}")
+    metrics.note(mood=mood_info["mood"], weather=weather_data["description"])
+
+    # Use alternative approach that doesn't rely on audio_features
+    # Changed limit to 25 tracks as requested
+    if mood_pools is not None:
+        # Cities that share a mood share one ranked pool
+        track_ids = select_for_playlist(mood_pools.get(mood_info), PLAYLIST_SIZE, salt=playlist_id)
+    else:
+        track_ids = search_and_rank_hindi_tracks_alternative(sp, mood_info, limit=PLAYLIST_SIZE, catalog=catalog)
+
+    if not track_ids:
+        print("No Hindi tracks found for the current mood")
+        metrics.note(status="no_tracks")
+        return False
+
+    if dry_run:
+        print(f"Dry run: would write {len(track_ids)} tracks to playlist {playlist_id or '(none)'}:")
+        for track_id in track_ids:
+            print(f"  spotify:track:{track_id}")
+        metrics.note(tracks=len(track_ids), status="dry_run")
+        return True
+
+    # Update playlist
+    with metrics.stage("playlist_update"):
+        success = update_playlist(sp, playlist_id, track_ids, city=city, weather_data=weather_data, guard=guard)
+    metrics.note(tracks=len(track_ids), status="ok" if success else "write_failed")
+    if success:
+        record_cycle(playlist_id, city, mood_info["mood"], track_ids)
+        print(f"Hindi music playlist updated successfully!")
+    else:
+        print("Failed to update playlist")
+    return success
+
+
+def run_playlist_cycle(city, playlist_id, catalog=None, mood_pools=None, dry_run=False, guard=None):
+    """
+    One full cycle for a playlist (auth, weather, ranking, write), logged as a
+    single JSON line. Returns None when the cycle could not start because
+    authentication or the weather lookup failed, otherwise run_update_cycle's result.
+    """
+    with metrics.cycle(city=city, playlist_id=playlist_id):
+        # Reuse the session; the token is refreshed only when close to expiry
+        sp = authenticate_spotify()
+        if not sp:
+            print("Failed to authenticate with Spotify")
+            metrics.note(status="auth_failed")
+            return None
+
+        weather_data = get_current_weather(city)
+        if not weather_data:
+            print(f"Failed to get weather data for {city}")
+            metrics.note(status="weather_failed")
+            return None
+
+        return run_update_cycle(sp, city, playlist_id, weather_data, catalog, mood_pools, dry_run, guard)
+
+
+# Nearest-neighbour index over the catalog's Hindi tracks, rebuilt as often as the pools
+feature_index = None
+feature_index_built_at = 0.0
+feature_index_lock = threading.Lock()
+
+
+def get_feature_index(catalog):
+    """The audio-feature index for the catalog, rebuilt when older than CANDIDATE_CACHE_TTL"""
+    global feature_index, feature_index_built_at
+    if catalog is None:
+        return None
+    with feature_index_lock:
+        if feature_index is None or time.monotonic() - feature_index_built_at > CANDIDATE_CACHE_TTL:
+            from feature_index import FeatureIndex
+            with metrics.stage("feature_index_build"):
+                feature_index = FeatureIndex.from_catalog(catalog, hindi_only=True)
+            feature_index_built_at = time.monotonic()
+            print(f"Indexed audio features of {len(feature_index)} Hindi tracks")
+        return feature_index
+
+
+def store_candidate_features(sp, tracks, catalog):
+    """
+    Record pool-build candidates (Hindi tracks) in the catalog with their audio
+    features, which is what the POOL_SOURCE=features index is built from.
+    Returns how many tracks had features fetched.
+    """
+    global feature_index
+    tracks = list({track["id"]: track for track in tracks if track.get("id")}.values())
+    catalog.put_tracks(tracks, classify=track_is_hindi)
+    missing = catalog.missing_audio_features([track["id"] for track in tracks])
+    if missing:
+        get_audio_features_batch(sp, missing, catalog)
+        # Index the new vectors on the next lookup
+        with feature_index_lock:
+            feature_index = None
+    return len(missing)
+
+
+def find_tracks_by_audio_features(mood_info, k, catalog):
+    """
+    The k catalog tracks whose audio features best match the mood, without any
+    search requests; empty when fewer than k tracks are indexed
+    """
+    index = get_feature_index(catalog)
+    if index is None or len(index) < k:
+        return []
+    return [track_id for track_id, _ in index.nearest(mood_info["audio_features"], k)]
+
+
+def create_mood_pools(catalog=None):
+    """
+    Per-mood ranked pool store: each pool is built once with the full search and
+    ranking (MOOD_POOL_SIZE deep) and reused by every city with that mood
+    """
+    def build(mood_info):
+        if POOL_SOURCE == "features":
+            with metrics.stage("pool_build"):
+                track_ids = find_tracks_by_audio_features(mood_info, MOOD_POOL_SIZE, catalog)
+            if track_ids:
+                return track_ids
+            print("Not enough indexed tracks for a feature-based pool, using keyword search")
+
+        sp = authenticate_spotify()
+        if not sp:
+            return None
+        print(f"Building ranked pool for the '{mood_info['mood']}' mood")
+        # Search builds feed the feature index until it can build pools on its own
+        candidates = [] if POOL_SOURCE == "features" and catalog is not None else None
+        with metrics.stage("pool_build"):
+            track_ids = search_and_rank_hindi_tracks_alternative(sp, mood_info, limit=MOOD_POOL_SIZE,
+                                                                 catalog=catalog, candidates=candidates)
+        if candidates:
+            fetched = store_candidate_features(sp, candidates, catalog)
+            print(f"Stored audio features of {fetched} new candidate tracks for the feature index")
+        return track_ids
+
+    pools = MoodPoolStore(build, ttl=CANDIDATE_CACHE_TTL)
+    metrics.add_collector(lambda: [
+        ("mood_pool_events_total", "counter", {"event": event}, count) for event, count in pools.stats.items()
+    ])
+    return pools
+
+
+def generate_playlist(mood_pools, city, limit=PLAYLIST_SIZE, playlist_id=None):
+    """
+    Weather -> mood -> ranked track ids for any city, as served by the playlist
+    API (at most MOOD_POOL_SIZE tracks). Writes the tracks to playlist_id when
+    one is given. Returns a JSON-ready dict; on failure it carries "error" and
+    an HTTP "status" instead.
+    """
+    weather_data = get_current_weather(city)
+    if not weather_data:
+        return {"error": f"No weather data for {city}", "status": 502}
+    mood_info = get_enhanced_mood_from_weather(weather_data)
+
+    sp = authenticate_spotify()
+    if not sp:
+        return {"error": "Spotify authentication failed", "status": 503}
+
+    track_ids = select_for_playlist(mood_pools.get(mood_info), limit, salt=playlist_id)
+    if not track_ids:
+        return {"error": f"No Hindi tracks found for the {mood_info['mood']} mood", "status": 502}
+
+    written = None
+    if playlist_id:
+        with metrics.stage("playlist_update"):
+            written = update_playlist(sp, playlist_id, track_ids, city=city, weather_data=weather_data)
+
+    return {
+        "city": city,
+        "weather": {field: weather_data[field] for field in ("description", "temperature", "clouds", "rain")},
+        "mood": mood_info["mood"],
+        "track_ids": track_ids,
+        "playlist_id": playlist_id,
+        "written": written,
+    }
+
+
+def collect_runtime_metrics():
+    """Export the counters other components keep (weather cache, rate limiter, API calls)"""
+    if weather_provider is not None:
+        for event, count in weather_provider.stats.items():
+            yield "weather_cache_events_total", "counter", {"event": event}, count
+    for event, count in playlist_cache.stats.items():
+        yield "playlist_cache_events_total", "counter", {"event": event}, count
+    if state_snapshot is not None:
+        yield "state_snapshot_saves_total", "counter", {}, state_snapshot.stats["saves"]
+        yield "state_snapshot_bytes", "gauge", {}, state_snapshot.stats["bytes"]
+    yield "spotify_limiter_requests_total", "counter", {}, spotify_limiter.stats["requests"]
+    yield "spotify_limiter_waits_total", "counter", {}, spotify_limiter.stats["waited"]
+    yield "spotify_limiter_wait_seconds_total", "counter", {}, spotify_limiter.stats["wait_seconds"]
+    yield "spotify_rate_limited_total", "counter", {}, spotify_limiter.stats["throttled"]
+    if spotify_session is not None:
+        for (method, endpoint), count in list(spotify_session.api_calls.items()):
+            yield "spotify_api_calls_total", "counter", {"method": method, "endpoint": endpoint}, count
+        for key in ("connects", "refreshes", "unauthorized"):
+            yield "spotify_auth_events_total", "counter", {"event": key}, spotify_session.stats[key]
+
+
+metrics.add_collector(collect_runtime_metrics)
+
+
+def start_metrics_server():
+    """Serve /metrics when METRICS_PORT is set"""
+    if not METRICS_PORT:
+        return None
+    try:
+        server = metrics.serve(METRICS_PORT, METRICS_HOST)
+        print(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        return server
+    except OSError as e:
+        print(f"Could not start metrics endpoint on port {METRICS_PORT}: {e}")
+        return None
+
+
+def run_scheduler(jobs_file=JOBS_FILE, once=False, dry_run=False):
+    """
+    Serve the (city, playlist, interval) jobs from the job table: all of them in
+    this process, or with LEASE_DB set, the share this worker leases from the
+    store the other workers use. With once, every job (every job due, when
+    sharded) runs a single cycle and the exit code is returned.
+    """
+    global weather_provider
+    from weather import BulkWeatherProvider, OPENWEATHER_API
+    jobs = load_jobs(jobs_file, default_interval=UPDATE_INTERVAL)
+    if not jobs:
+        print(f"No jobs found in {jobs_file}. Exiting.")
+        return 1 if once else None
+
+    cities = {job.city.lower() for job in jobs}
+    print(f"Starting scheduler for {len(jobs)} playlists across {len(cities)} cities "
+          f"({MAX_CONCURRENT_JOBS} workers)")
+    if LEASE_DB:
+        import socket
+        worker_id = WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+        print(f"Sharing jobs with other workers through {LEASE_DB} as {worker_id}")
+
+    # Weather for every job city comes from group requests of up to 20 cities
+    weather_provider = BulkWeatherProvider(WEATHER_API_KEY, ttl=WEATHER_CACHE_TTL, timeout=(3.05, WEATHER_TIMEOUT),
+                                           base_url=WEATHER_BASE_URL or OPENWEATHER_API)
+    if not once:
+        # Restored readings still within WEATHER_CACHE_TTL are not fetched again below
+        restore_warm_state(weather=weather_provider, verdicts=hindi_classifier, playlists=playlist_cache)
+        if state_snapshot is not None:
+            state_snapshot.register("cycles", export_cycles, restore_cycles)
+    requests_made = weather_provider.refresh([job.city for job in jobs])
+    print(f"Fetched weather for {len(weather_provider.table)} cities in {requests_made} requests")
+
+    catalog = open_catalog()
+    # Search cost is paid once per mood; pools in use are rebuilt in the background
+    mood_pools = create_mood_pools(catalog)
+    if not once:
+        restore_warm_state(pools=mood_pools)
+
+    # One Spotify client shared by all jobs; the token is refreshed in place
+    authenticate_spotify()
+
+    def run_job(job):
+        print(f"Updating playlist {job.playlist_id} for {job.city} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        guard = getattr(scheduler, "check_lease", None)
+        return bool(run_playlist_cycle(job.city, job.playlist_id, catalog, mood_pools, dry_run, guard))
+
+    if LEASE_DB:
+        from job_leases import LeaseStore, LeaseWorker
+        scheduler = LeaseWorker(LeaseStore(LEASE_DB, lease_seconds=LEASE_SECONDS), run_job,
+                                max_workers=MAX_CONCURRENT_JOBS, worker_id=worker_id)
+        # Playlists dropped from JOBS_FILE stop being leased
+        retired = scheduler.store.set_jobs(jobs)
+        if retired:
+            print(f"Retired {len(retired)} jobs no longer in {jobs_file}: {', '.join(retired)}")
+        metrics.add_collector(lambda: [
+            ("lease_events_total", "counter", {"event": event}, count) for event, count in scheduler.stats.items()
+        ])
+    else:
+        scheduler = JobScheduler(run_job, max_workers=MAX_CONCURRENT_JOBS)
+        # Playlists written shortly before a restart wait for their next due time
+        for job in jobs:
+            scheduler.add(job, delay=0 if once else next_cycle_delay(job.playlist_id, job.interval))
+
+    if once and LEASE_DB:
+        succeeded, attempted = scheduler.run(once=True)
+        print(f"Updated {succeeded} of {attempted} playlists claimed by {worker_id}")
+        return 0 if succeeded == attempted else 1
+    if once:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="jobs") as pool:
+            results = list(pool.map(run_job, jobs))
+        print(f"Updated {sum(results)} of {len(jobs)} playlists")
+        return 0 if all(results) else 1
+
+    mood_pools.start()
+    start_metrics_server()
+
+    prewarmer = None
+    if PREWARM_HORIZON > 0:
+        # Readings refreshed this far ahead are still within WEATHER_CACHE_TTL when the job runs
+        weather_lead = min(PREWARM_HORIZON, WEATHER_CACHE_TTL // 2)
+        prewarmer = Prewarmer(
+            scheduler,
+            predict=predict_moods,
+            warm=mood_pools.warm,
+            refresh_forecast=weather_provider.refresh_forecast,
+            refresh_weather=lambda cities: weather_provider.refresh(cities, max_age=WEATHER_CACHE_TTL - weather_lead),
+            horizon=PREWARM_HORIZON,
+            weather_lead=weather_lead,
+        )
+        metrics.add_collector(lambda: [
+            ("prewarm_events_total", "counter", {"event": event}, count) for event, count in prewarmer.stats.items()
+        ])
+        restore_warm_state(prewarm=prewarmer)
+        prewarmer.start()
+
+    if state_snapshot is not None:
+        state_snapshot.start()
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("Stopping scheduler...")
+        scheduler.stop()
+        if prewarmer:
+            prewarmer.stop()
+    finally:
+        if state_snapshot is not None:
+            state_snapshot.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Keep a Spotify playlist of Hindi music in tune with the weather.")
+    parser.add_argument("--once", action="store_true",
+                        help="run a single update cycle and exit (exit code 1 if it failed)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="pick and print the tracks without writing the playlist (implies --once)")
+    parser.add_argument("--city", default=CITY, help="city to follow (default: CITY from the environment)")
+    parser.add_argument("--playlist-id", default=PLAYLIST_ID,
+                        help="playlist to update (default: PLAYLIST_ID from the environment)")
+    return parser.parse_args(argv)
+
+
+def run_once(city, playlist_id, dry_run=False):
+    """One cycle for cron and job runners; returns the process exit code"""
+    catalog = open_catalog()
+    return 0 if run_playlist_cycle(city, playlist_id, catalog, dry_run=dry_run) else 1
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    once = args.once or args.dry_run
+
+    if JOBS_FILE:
+        return run_scheduler(JOBS_FILE, once=once, dry_run=args.dry_run)
+
+    city, playlist_id = args.city, args.playlist_id
+    if not playlist_id and not args.dry_run:
+        print("No playlist to update: set PLAYLIST_ID or pass --playlist-id")
+        return 2
+
+    if once:
+        return run_once(city, playlist_id, dry_run=args.dry_run)
+
+    print(f"Starting Enhanced Weather-Based Hindi Music Spotify Playlist Updater for {city}")
+
+    # Local catalog of tracks, verdicts and audio features shared across cycles
+    catalog = open_catalog()
+    if catalog:
+        print(f"Using track catalog at {CATALOG_PATH}: {catalog.stats()}")
+
+    start_metrics_server()
+
+    if state_snapshot is not None:
+        restore_warm_state(weather=get_weather_provider(), verdicts=hindi_classifier, playlists=playlist_cache)
+        state_snapshot.register("cycles", export_cycles, restore_cycles)
+        state_snapshot.start()
+        delay = next_cycle_delay(playlist_id, UPDATE_INTERVAL)
+        if delay:
+            print(f"Playlist was updated before the restart; next update in {delay / 60:.0f} minutes...")
+            time.sleep(delay)
+
+    # Initial authentication; the first cycle's playlist read reports a bad PLAYLIST_ID
     sp = authenticate_spotify()
     if not sp:
         print("Failed to authenticate with Spotify. Exiting.")
-        return
+        return 1
 
-    # Check playlist ID
     try:
-        playlist_info = sp.playlist(PLAYLIST_ID)
-        print(f"Connected to playlist: {playlist_info['name']}")
-    except Exception as e:
-        print(f"Error connecting to playlist: {e}")
-        return
+        run_update_loop(city, playlist_id, catalog)
+    finally:
+        if state_snapshot is not None:
+            state_snapshot.stop()
+
 
-    # Main loop
+def run_update_loop(city, playlist_id, catalog):
+    """Update the playlist every UPDATE_INTERVAL seconds, forever"""
     while True:
         try:
             print("\n" + "=" * 50)
             print(f"Updating playlist at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-            # Re-authenticate on each iteration to avoid token issues
-            sp = authenticate_spotify()
-            if not sp:
-                print("Failed to re-authenticate. Waiting 60 seconds...")
-                time.sleep(60)
-                continue
-
-            # Get weather
-            weather_data = get_current_weather(CITY)
-            if not weather_data:
-                print("Failed to get weather data")
+            if run_playlist_cycle(city, playlist_id, catalog) is None:
+                print("Retrying in 60 seconds...")
                 time.sleep(60)
                 continue
-
-            # Print weather report
-            print(generate_weather_report(weather_data))
-
-            # Get mood
-            mood_info = get_enhanced_mood_from_weather(weather_data)
-            print(f"Selected mood: {mood_info['mood']}")
-            print(f"Keywords: {', '.join(mood_info['keywords'])}")
-
-            # Use alternative approach that doesn't rely on audio_features
-            # Changed limit to 25 tracks as requested
-            track_ids = search_and_rank_hindi_tracks_alternative(sp, mood_info, limit=25)
-
-            if track_ids:
-                # Update playlist
-                success = update_playlist(sp, PLAYLIST_ID, track_ids)
-                if success:
-                    print(f"Hindi music playlist updated successfully!")
-                else:
-                    print("Failed to update playlist")
-            else:
-                print("No Hindi tracks found for the current mood")
+            stats = auth_stats()
+            print(f"Auth: {stats['connects']} connects, {stats['refreshes']} token refreshes, "
+                  f"{stats['unauthorized']} 401 recoveries")
 
             # Wait for next update
             print(f"Next update in {UPDATE_INTERVAL // 60} minutes...")
@@ -691,4 +1204,4 @@ def main():
             time.sleep(60)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
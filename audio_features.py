@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import spotipy
+
+# Largest id list the audio-features endpoint accepts
+MAX_BATCH_SIZE = 100
+MIN_BATCH_SIZE = 5
+
+
+class AuthError(Exception):
+    """The Spotify token was rejected; retrying will not help"""
+
+
+def _is_auth_error(error):
+    if isinstance(error, spotipy.SpotifyException) and error.http_status == 401:
+        return True
+    message = str(error).lower()
+    return "token" in message or "unauthorized" in message
+
+
+def fetch_audio_features(sp, track_ids, max_workers=4, batch_size=MAX_BATCH_SIZE, max_attempts=4):
+    """
+    Fetch audio features for track_ids and return a list aligned with the input
+    (None where Spotify has no features or every attempt failed).
+
+    Batches of up to `batch_size` ids run concurrently. Rate limiting and 429
+    back-off are left to the client (the app's ManagedSpotify shares one
+    limiter across every request). A failed batch is retried with half the
+    batch size so one bad id cannot sink a full batch; a rejected token stops
+    everything.
+    """
+    if not track_ids:
+        return []
+
+    unique_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+    found = {}
+    size = max(MIN_BATCH_SIZE, min(batch_size, MAX_BATCH_SIZE))
+
+    pending = [(chunk, 1) for chunk in _chunks(unique_ids, size)]
+    batch_number = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="audio-features") as pool:
+        while pending:
+            futures = [(chunk, attempt, pool.submit(sp.audio_features, chunk)) for chunk, attempt in pending]
+            pending = []
+
+            for chunk, attempt, future in futures:
+                batch_number += 1
+                try:
+                    features = future.result()
+                except Exception as e:
+                    if _is_auth_error(e):
+                        print("Token seems invalid - stopping audio feature fetching")
+                        raise AuthError(str(e)) from e
+
+                    if attempt >= max_attempts:
+                        print(f"Giving up on {len(chunk)} tracks after {attempt} attempts: {e}")
+                        continue
+
+                    # Shrink the batch size for this and later retries
+                    size = max(MIN_BATCH_SIZE, min(size, len(chunk)) // 2)
+                    print(f"Error in audio features batch {batch_number}: {e}; retrying with batches of {size}")
+                    pending.extend((smaller, attempt + 1) for smaller in _chunks(chunk, size))
+                    continue
+
+                for item in features or []:
+                    if item and item.get("id"):
+                        found[item["id"]] = item
+
+    print(f"Got audio features for {len(found)} of {len(unique_ids)} tracks")
+    return [found.get(track_id) for track_id in track_ids]
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
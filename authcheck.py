@@ -1,28 +1,32 @@
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
 import os
 from dotenv import load_dotenv
 
+from ratelimit import PriorityRateLimiter
+from spotify_auth import SCOPE, SpotifySession
+
 load_dotenv()
 
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "10"))
+SPOTIFY_BURST = int(os.getenv("SPOTIFY_BURST", "10"))
 
 
 def test_auth():
-    scope = "playlist-modify-public playlist-modify-private user-read-private"
     try:
-        sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-            client_id=SPOTIFY_CLIENT_ID,
-            client_secret=SPOTIFY_CLIENT_SECRET,
-            redirect_uri=SPOTIFY_REDIRECT_URI,
-            scope=scope
-        ))
+        # Same client, token cache and rate limiting as app.py
+        session = SpotifySession(
+            SPOTIFY_CLIENT_ID,
+            SPOTIFY_CLIENT_SECRET,
+            SPOTIFY_REDIRECT_URI,
+            scope=SCOPE,
+            limiter=PriorityRateLimiter(SPOTIFY_RATE_LIMIT, SPOTIFY_BURST),
+        )
 
         # Test authentication
-        user = sp.current_user()
-        print(f"Authentication successful! Logged in as: {user['display_name']}")
+        sp = session.connect()
+        print(f"Authentication successful! Logged in as: {session.display_name}")
 
         # Test a simple API call
         results = sp.search(q="Arijit Singh", limit=1)
@@ -35,4 +39,4 @@ def test_auth():
 
 
 if __name__ == "__main__":
-    test_auth()
\ No newline at end of file
+    test_auth()
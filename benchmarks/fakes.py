@@ -0,0 +1,240 @@
+"""
+Offline stand-ins for spotipy.Spotify and the weather provider.
+
+Both replay the recorded API responses in benchmarks/fixtures. The fake
+Spotify client turns the recorded track objects into a synthetic catalog of
+any size (track i is derived from recorded track i % len(recorded)), pages
+through it like the real API, and keeps writable user playlists in memory.
+"""
+import json
+import os
+import zlib
+from urllib.parse import parse_qs, urlparse
+
+from weather import parse_weather
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Mix of Hindi and non-Hindi artists so is_hindi_track has real work to do
+SYNTHETIC_ARTISTS = [
+    "Arijit Singh", "The Weeknd", "Shreya Ghoshal", "Taylor Swift", "Jubin Nautiyal",
+    "Ed Sheeran", "Pritam", "Dua Lipa", "Tanishk Bagchi", "AP Dhillon",
+    "Vishal Mishra", "Coldplay", "Sachet Tandon", "Bad Bunny", "Neha Kakkar",
+]
+
+# Spotify caps playlists at 10,000 items
+MAX_PLAYLIST_ITEMS = 10_000
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class SyntheticCatalog:
+    """Deterministic catalog of `size` tracks built from recorded track objects"""
+
+    def __init__(self, size):
+        self.size = max(1, size)
+        self.templates = load_fixture("search_tracks.json")["tracks"]["items"]
+        self.features = load_fixture("audio_features.json")["audio_features"]
+
+    def track_id(self, i):
+        return f"{i:022d}"
+
+    def track(self, i):
+        template = self.templates[i % len(self.templates)]
+        track = dict(template)
+        artist = dict(template["artists"][0])
+        artist["name"] = SYNTHETIC_ARTISTS[(i * 7) % len(SYNTHETIC_ARTISTS)]
+        track_id = self.track_id(i)
+        track.update({
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "href": f"https://api.spotify.com/v1/tracks/{track_id}",
+            "name": f"{template['name']} {i}",
+            "artists": [artist],
+            "popularity": (i * 37) % 101,
+            "duration_ms": 45_000 + (i * 7919) % 480_000,
+        })
+        return track
+
+    def audio_features(self, i):
+        template = self.features[i % len(self.features)]
+        features = dict(template)
+        shift = ((i * 13) % 21 - 10) / 100
+        for name in ("energy", "valence", "danceability", "acousticness"):
+            features[name] = min(1.0, max(0.0, template[name] + shift))
+        features["tempo"] = template["tempo"] + shift * 100
+        features["id"] = self.track_id(i)
+        features["popularity"] = (i * 37) % 101
+        return features
+
+    def offset_for(self, key):
+        return zlib.crc32(key.encode("utf-8")) % self.size
+
+
+class FakeSpotify:
+    """Replays recorded response shapes; counts every call by endpoint name"""
+
+    def __init__(self, catalog_size=1000, playlist_size=None):
+        self.catalog = SyntheticCatalog(catalog_size)
+        self.playlist_size = min(playlist_size or catalog_size, MAX_PLAYLIST_ITEMS)
+        self.playlist_template = load_fixture("playlist_tracks.json")
+        self.user_playlists = {}
+        self.playlist_meta = {}
+        self.versions = {}
+        self.calls = {}
+
+    def _count(self, endpoint):
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def _index(self, key, position):
+        return (self.catalog.offset_for(key) + position) % self.catalog.size
+
+    # Read endpoints
+
+    def current_user(self):
+        self._count("current_user")
+        return {"display_name": "Benchmark User", "id": "benchmark"}
+
+    def search(self, q, limit=10, offset=0, type="track", market=None):
+        self._count("search")
+        total = min(self.catalog.size, 1000)
+        end = min(offset + limit, total)
+        items = [self.catalog.track(self._index(q, position)) for position in range(offset, end)]
+        next_url = f"fake://search?q={q}&offset={end}&limit={limit}" if end < total else None
+        return {"tracks": {"items": items, "limit": limit, "offset": offset, "total": total,
+                           "next": next_url, "previous": None}}
+
+    def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0, market=None, additional_types=("track",)):
+        self._count("playlist_tracks")
+        if playlist_id in self.user_playlists:
+            return self._user_page(playlist_id, offset, limit)
+        return self._editorial_page(playlist_id, offset, limit)
+
+    def _editorial_page(self, playlist_id, offset, limit):
+        end = min(offset + limit, self.playlist_size)
+        template_item = self.playlist_template["items"][0]
+        items = []
+        for position in range(offset, end):
+            item = dict(template_item)
+            item["track"] = self.catalog.track(self._index(playlist_id, position))
+            items.append(item)
+        next_url = f"fake://playlist/{playlist_id}?offset={end}&limit={limit}" if end < self.playlist_size else None
+        return {"items": items, "limit": limit, "offset": offset, "total": self.playlist_size,
+                "next": next_url, "previous": None}
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, market=None, additional_types=("track", "episode")):
+        return self.playlist_tracks(playlist_id, fields=fields, limit=limit, offset=offset, market=market)
+
+    def playlist(self, playlist_id, fields=None, market=None, additional_types=("track",)):
+        self._count("playlist")
+        meta = self.playlist_meta.get(playlist_id, {"name": "Benchmark Playlist", "description": ""})
+        result = {
+            "id": playlist_id,
+            "name": meta["name"],
+            "description": meta["description"],
+            "snapshot_id": self._snapshot(playlist_id)["snapshot_id"],
+        }
+        # Head-only reads (fields without "tracks") skip building the first page
+        if fields is None or "tracks" in fields:
+            if playlist_id in self.user_playlists:
+                result["tracks"] = self._user_page(playlist_id, 0, 100)
+            else:
+                result["tracks"] = self._editorial_page(playlist_id, 0, 100)
+        return result
+
+    def next(self, result):
+        url = urlparse(result["next"])
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        offset, limit = int(query["offset"]), int(query["limit"])
+        if url.netloc == "search":
+            return self.search(query["q"], limit=limit, offset=offset)["tracks"]
+        playlist_id = url.path.lstrip("/")
+        return self.playlist_tracks(playlist_id, limit=limit, offset=offset)
+
+    def audio_features(self, tracks=None):
+        self._count("audio_features")
+        return [self.catalog.audio_features(int(track_id)) if track_id.isdigit() else None for track_id in tracks]
+
+    def _user_page(self, playlist_id, offset, limit):
+        uris = self.user_playlists.get(playlist_id, [])
+        end = min(offset + limit, len(uris))
+        items = [{"track": {"id": uri.rsplit(":", 1)[-1], "uri": uri}} for uri in uris[offset:end]]
+        next_url = f"fake://playlist/{playlist_id}?offset={end}&limit={limit}" if end < len(uris) else None
+        return {"items": items, "limit": limit, "offset": offset, "total": len(uris), "next": next_url}
+
+    # Write endpoints (user playlists only)
+
+    def set_user_playlist(self, playlist_id, track_ids, name="Benchmark Playlist", description=""):
+        self.user_playlists[playlist_id] = [f"spotify:track:{track_id}" for track_id in track_ids]
+        self.playlist_meta[playlist_id] = {"name": name, "description": description}
+        self._changed(playlist_id)
+
+    def _changed(self, playlist_id):
+        self.versions[playlist_id] = self.versions.get(playlist_id, 0) + 1
+
+    def _snapshot(self, playlist_id):
+        return {"snapshot_id": f"snapshot-{self.versions.get(playlist_id, 0)}"}
+
+    def playlist_change_details(self, playlist_id, name=None, public=None, collaborative=None, description=None):
+        self._count("playlist_change_details")
+        self.playlist_meta[playlist_id] = {"name": name or "", "description": description or ""}
+
+    def playlist_replace_items(self, playlist_id, items):
+        self._count("playlist_replace_items")
+        self.user_playlists[playlist_id] = [_as_uri(item) for item in items]
+        self._changed(playlist_id)
+        return self._snapshot(playlist_id)
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self._count("playlist_add_items")
+        uris = self.user_playlists.setdefault(playlist_id, [])
+        position = len(uris) if position is None else position
+        uris[position:position] = [_as_uri(item) for item in items]
+        self._changed(playlist_id)
+        return self._snapshot(playlist_id)
+
+    def playlist_remove_specific_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        self._count("playlist_remove_specific_occurrences_of_items")
+        uris = self.user_playlists[playlist_id]
+        for position in sorted((p for item in items for p in item["positions"]), reverse=True):
+            del uris[position]
+        self._changed(playlist_id)
+        return self._snapshot(playlist_id)
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        self._count("playlist_reorder_items")
+        uris = self.user_playlists[playlist_id]
+        moved = uris[range_start:range_start + range_length]
+        uris[insert_before:insert_before] = moved
+        if insert_before <= range_start:
+            range_start += range_length
+        del uris[range_start:range_start + range_length]
+        self._changed(playlist_id)
+        return self._snapshot(playlist_id)
+
+
+def _as_uri(item):
+    return item if item.startswith("spotify:") else f"spotify:track:{item}"
+
+
+class FakeWeatherProvider:
+    """Serves recorded OpenWeatherMap responses by city name (first record for unknown cities)"""
+
+    def __init__(self):
+        self.records = load_fixture("weather_current.json")
+        self.by_city = {record["name"].lower(): record for record in self.records}
+        self.stats = {"hits": 0, "fetches": 0}
+
+    def fetch(self, city):
+        self.stats["fetches"] += 1
+        return parse_weather(self.by_city.get(city.strip().lower(), self.records[0]))
+
+    def get(self, city):
+        return self.fetch(city)
+
+    def observations(self):
+        """All recorded observations parsed into the app's weather dict shape"""
+        return [parse_weather(record) for record in self.records]
@@ -0,0 +1,113 @@
+"""
+Correctness check for the playlist diff planner.
+
+Replays random current/target playlists (with repeated tracks, and long
+enough to need batched writes) through sync_playlist_items on the fake
+Spotify client and checks that the playlist ends up exactly as desired, that
+the reported request count matches the writes made, and that a second sync
+writes nothing. Also checks that playlists with a null name or description
+read as empty strings. Exits non-zero on the first mismatch:
+
+    python benchmarks/playlist_sync_check.py
+    python benchmarks/playlist_sync_check.py --cases 2000 --seed 7
+"""
+import argparse
+import os
+import random
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from playlist_cache import PlaylistCache  # noqa: E402
+from playlist_sync import read_playlist_state, sync_playlist_items, track_uri  # noqa: E402
+from fakes import FakeSpotify  # noqa: E402
+
+PLAYLIST_ID = "check"
+
+WRITE_ENDPOINTS = (
+    "playlist_remove_specific_occurrences_of_items",
+    "playlist_reorder_items",
+    "playlist_add_items",
+    "playlist_replace_items",
+)
+
+
+def random_ids(rng, size, universe):
+    return [str(rng.randrange(universe)) for _ in range(size)]
+
+
+def writes(sp):
+    return sum(sp.calls.get(endpoint, 0) for endpoint in WRITE_ENDPOINTS)
+
+
+def check_case(rng, use_cache):
+    """None if the case passes, otherwise a description of the mismatch"""
+    size = rng.choice((0, 1, 5, 30, 150, 260))
+    universe = max(1, int(size * rng.uniform(0.8, 3)))
+    current = random_ids(rng, size, universe)
+    desired = random_ids(rng, rng.choice((0, 1, 5, 30, 150, 260)), universe)
+    if rng.random() < 0.5 and current:
+        # Mostly-unchanged playlists are the common case in production
+        desired = list(current)
+        for _ in range(rng.randint(1, 4)):
+            desired.insert(rng.randrange(len(desired) + 1), desired.pop(rng.randrange(len(desired))))
+
+    sp = FakeSpotify(catalog_size=10)
+    sp.set_user_playlist(PLAYLIST_ID, current)
+    cache = PlaylistCache() if use_cache else None
+    if cache is not None:
+        read_playlist_state(sp, PLAYLIST_ID, cache)
+
+    before = writes(sp)
+    summary = sync_playlist_items(sp, PLAYLIST_ID, desired, max_extra_requests=10_000, cache=cache)
+    expected = list(dict.fromkeys(track_uri(track_id) for track_id in desired))
+    actual = sp.user_playlists[PLAYLIST_ID]
+    if actual != expected:
+        return f"{summary['strategy']} left {actual[:8]}... instead of {expected[:8]}... (current {current[:8]}...)"
+    if writes(sp) - before != summary["requests"]:
+        return f"reported {summary['requests']} requests but made {writes(sp) - before}"
+
+    before = writes(sp)
+    again = sync_playlist_items(sp, PLAYLIST_ID, desired, cache=cache)
+    if again["strategy"] != "unchanged" or writes(sp) != before:
+        return f"second sync was {again['strategy']} with {writes(sp) - before} writes"
+    return None
+
+
+def check_null_details():
+    """Spotify sends null for a missing description; reads must still return strings"""
+    sp = FakeSpotify(catalog_size=10)
+    sp.set_user_playlist(PLAYLIST_ID, ["1", "2"], name=None, description=None)
+    cache = PlaylistCache()
+    for state in (read_playlist_state(sp, PLAYLIST_ID), read_playlist_state(sp, PLAYLIST_ID, cache),
+                  read_playlist_state(sp, PLAYLIST_ID, cache)):
+        if state["name"] != "" or state["description"] != "":
+            return f"null details read as {state['name']!r} / {state['description']!r}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=500, help="random playlists to sync")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failure = check_null_details()
+    for case in range(args.cases):
+        if failure:
+            break
+        failure = check_case(rng, use_cache=case % 2 == 1)
+        if failure:
+            failure = f"case {case} (seed {args.seed}): {failure}"
+
+    if failure:
+        print(f"FAIL: {failure}")
+        return 1
+    print(f"Playlist sync matched the target in {args.cases} random cases")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
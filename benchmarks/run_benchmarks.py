@@ -0,0 +1,320 @@
+"""
+Offline benchmarks for the playlist pipeline.
+
+Replays recorded Spotify / OpenWeatherMap responses (benchmarks/fixtures)
+through fake clients, so no credentials or network are needed. Each
+benchmark runs at several synthetic pool sizes and reports throughput,
+p50/p99 latency and peak traced memory to a JSON file that later runs can
+be compared against:
+
+    python benchmarks/run_benchmarks.py --sizes 100,10000 --output bench_results.json
+    python benchmarks/run_benchmarks.py --compare bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import app  # noqa: E402
+from feature_index import FeatureIndex  # noqa: E402
+from scoring import build_feature_matrix  # noqa: E402
+from fakes import MAX_PLAYLIST_ITEMS, FakeSpotify, FakeWeatherProvider, SyntheticCatalog  # noqa: E402
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+BATCH_SIZE = 1_000
+PIPELINE_REPEATS = 5
+MEMORY_BATCHES = 20
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def quiet():
+    """Silence the app's progress prints while timing"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+# Per-item benchmarks: workloads are generated in batches so a 1M-track run
+# never holds 1M track dicts at once; latency percentiles are per item,
+# averaged within each batch.
+
+def item_batches(size, make_item):
+    for start in range(0, size, BATCH_SIZE):
+        yield [make_item(i) for i in range(start, min(start + BATCH_SIZE, size))]
+
+
+def run_per_item(size, make_item, process_batch, measure_memory=True):
+    per_item = []
+    total = 0.0
+    with quiet():
+        for batch in item_batches(size, make_item):
+            started = time.perf_counter()
+            process_batch(batch)
+            elapsed = time.perf_counter() - started
+            total += elapsed
+            per_item.append(elapsed / len(batch))
+
+    peak = None
+    if measure_memory:
+        peak = 0
+        tracemalloc.start()
+        with quiet():
+            for n, batch in enumerate(item_batches(size, make_item)):
+                if n >= MEMORY_BATCHES:
+                    break
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                process_batch(batch)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+    return {"unit": "items", "items": size, "seconds": total, "latencies": per_item, "peak_bytes": peak}
+
+
+def run_repeated(call, repeats, setup=None, measure_memory=True, items_per_call=1, unit="calls"):
+    latencies = []
+    with quiet():
+        for _ in range(repeats):
+            context = setup() if setup else None
+            started = time.perf_counter()
+            call(context)
+            latencies.append(time.perf_counter() - started)
+
+    peak = None
+    if measure_memory:
+        context = setup() if setup else None
+        tracemalloc.start()
+        with quiet():
+            call(context)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {"unit": unit, "items": items_per_call * repeats, "seconds": sum(latencies),
+            "latencies": latencies, "peak_bytes": peak}
+
+
+# Benchmarks
+
+def bench_mood(size, weather, measure_memory):
+    observations = weather.observations()
+    return run_per_item(
+        size,
+        lambda i: observations[i % len(observations)],
+        lambda batch: [app.get_enhanced_mood_from_weather(record) for record in batch],
+        measure_memory,
+    )
+
+
+def bench_is_hindi(size, weather, measure_memory):
+    catalog = SyntheticCatalog(size)
+    app.hindi_classifier.clear_cache()
+    return run_per_item(size, catalog.track, lambda batch: [app.is_hindi_track(track) for track in batch],
+                        measure_memory)
+
+
+def bench_track_score(size, weather, measure_memory):
+    catalog = SyntheticCatalog(size)
+    target = app.WEATHER_MOOD_MAP["light rain"]["audio_features"]
+    return run_per_item(size, catalog.audio_features,
+                        lambda batch: [app.calculate_track_score(features, target) for features in batch],
+                        measure_memory)
+
+
+def bench_rank_pool(size, weather, measure_memory):
+    catalog = SyntheticCatalog(size)
+    target = app.WEATHER_MOOD_MAP["light rain"]["audio_features"]
+    features = [catalog.audio_features(i) for i in range(size)]
+    track_ids = [item["id"] for item in features]
+    return run_repeated(lambda _: app.rank_tracks_by_features(track_ids, features, target, limit=25),
+                        PIPELINE_REPEATS, measure_memory=measure_memory, items_per_call=size, unit="items")
+
+
+def bench_feature_index(size, weather, measure_memory):
+    catalog = SyntheticCatalog(size)
+    features = [catalog.audio_features(i) for i in range(size)]
+    matrix, popularity = build_feature_matrix(features)
+    index = FeatureIndex([item["id"] for item in features], matrix, popularity)
+    del features
+    targets = app.WEATHER_MOOD_MAP["light rain"]["audio_features"]
+    result = run_repeated(lambda _: index.nearest(targets, 25), PIPELINE_REPEATS * 20, measure_memory=measure_memory,
+                          unit="queries")
+    result["effective_size"] = len(index)
+    return result
+
+
+def bench_search_and_rank(size, weather, measure_memory):
+    """
+    Rank `size` candidates: the keyword searches cannot fill a `size`-track
+    selection (per-artist caps keep it short), so playlist mining streams
+    editorial playlists holding `size` tracks in total (at most 10,000 each,
+    as on Spotify) before the mining budget of size * MINING_BUDGET_FACTOR runs out.
+    """
+    mood_info = app.WEATHER_MOOD_MAP["clear sky"]
+    playlist_size = min(size, MAX_PLAYLIST_ITEMS)
+    playlist_ids = [f"benchmark-mining-{i}" for i in range(-(-size // playlist_size))]
+
+    def setup():
+        app.hindi_classifier.clear_cache()
+        return FakeSpotify(catalog_size=size, playlist_size=playlist_size)
+
+    def call(sp):
+        return app.search_and_rank_hindi_tracks_alternative(sp, mood_info, limit=size)
+
+    # Cold mining every run; the process-wide playlist cache would keep every mined page
+    saved = app.HINDI_PLAYLIST_IDS, app.playlist_cache
+    app.HINDI_PLAYLIST_IDS, app.playlist_cache = playlist_ids, None
+    try:
+        result = run_repeated(call, PIPELINE_REPEATS, setup, measure_memory,
+                              items_per_call=len(playlist_ids) * playlist_size, unit="items")
+        sp = setup()
+        with quiet():
+            call(sp)
+    finally:
+        app.HINDI_PLAYLIST_IDS, app.playlist_cache = saved
+    result["api_calls"] = sp.calls
+    result["effective_size"] = len(playlist_ids) * playlist_size
+    return result
+
+
+def bench_update_playlist(size, weather, measure_memory):
+    weather_data = weather.get("Mumbai")
+    playlist_size = min(size, 10_000)
+    current = [f"{i:022d}" for i in range(playlist_size)]
+    # Same mood as last cycle: a tenth of the tracks change and one moves
+    keep = current[: playlist_size - playlist_size // 10]
+    desired = keep[1:] + keep[:1] + [f"{i:022d}" for i in range(playlist_size, playlist_size + playlist_size // 10)]
+
+    def setup():
+        sp = FakeSpotify(catalog_size=size)
+        sp.set_user_playlist("benchmark", current)
+        return sp
+
+    result = run_repeated(lambda sp: app.update_playlist(sp, "benchmark", desired, city="Mumbai", weather_data=weather_data),
+                          PIPELINE_REPEATS, setup, measure_memory)
+    sp = setup()
+    with quiet():
+        app.update_playlist(sp, "benchmark", desired, city="Mumbai", weather_data=weather_data)
+    result["api_calls"] = sp.calls
+    result["effective_size"] = playlist_size
+    return result
+
+
+BENCHMARKS = {
+    "get_enhanced_mood_from_weather": bench_mood,
+    "is_hindi_track": bench_is_hindi,
+    "calculate_track_score": bench_track_score,
+    "rank_tracks_by_features": bench_rank_pool,
+    "feature_index_nearest": bench_feature_index,
+    "search_and_rank_hindi_tracks_alternative": bench_search_and_rank,
+    "update_playlist": bench_update_playlist,
+}
+
+
+def summarize(name, size, raw):
+    latencies = raw["latencies"]
+    entry = {
+        "benchmark": name,
+        "size": size,
+        "unit": raw["unit"],
+        "throughput_per_s": raw["items"] / raw["seconds"] if raw["seconds"] else None,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_memory_bytes": raw["peak_bytes"],
+        "samples": len(latencies),
+    }
+    for key in ("api_calls", "effective_size"):
+        if key in raw:
+            entry[key] = raw[key]
+    return entry
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(entry["benchmark"], entry["size"]): entry for entry in json.load(f)["results"]}
+
+    print(f"\nComparison against {baseline_path} (ratio > 1 means slower / larger now):")
+    for entry in results:
+        old = baseline.get((entry["benchmark"], entry["size"]))
+        if not old:
+            continue
+        p50 = entry["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("nan")
+        memory = (entry["peak_memory_bytes"] / old["peak_memory_bytes"]
+                  if entry["peak_memory_bytes"] and old.get("peak_memory_bytes") else float("nan"))
+        print(f"  {entry['benchmark']:<42} {entry['size']:>9}  p50 x{p50:.2f}  peak mem x{memory:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated synthetic pool sizes")
+    parser.add_argument("--only", help="comma-separated benchmark names to run")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    # Keep every run offline and independent of local caches
+    weather = FakeWeatherProvider()
+    app.weather_provider = weather
+
+    results = []
+    for name in names:
+        for size in sizes:
+            raw = BENCHMARKS[name](size, weather, not args.no_memory)
+            entry = summarize(name, size, raw)
+            results.append(entry)
+            peak = entry["peak_memory_bytes"]
+            print(f"{name:<42} {size:>9}  {entry['throughput_per_s']:>14,.0f} {entry['unit']}/s  "
+                  f"p50 {entry['p50_ms']:.4f} ms  p99 {entry['p99_ms']:.4f} ms  "
+                  f"peak {'-' if peak is None else f'{peak / 1024:,.0f} KiB'}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "batch_size": BATCH_SIZE,
+            "pipeline_repeats": PIPELINE_REPEATS,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Startup-time budget for short-lived runs (cron, job runners).
+
+Measures, in fresh interpreters, how long `import app` takes and how much
+`python app.py --help` adds on top of a bare interpreter start, and checks
+that importing app.py does not load numpy, requests or spotipy. Exits
+non-zero when a budget is exceeded:
+
+    python benchmarks/startup_budget.py
+    python benchmarks/startup_budget.py --runs 20 --import-budget-ms 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets in milliseconds; `import app` measured ~30 ms (from ~270 ms with eager imports), --help ~50 ms
+IMPORT_BUDGET_MS = 80
+CLI_BUDGET_MS = 150
+
+# Must stay out of `import app`; they are loaded by the code paths that use them
+HEAVY_MODULES = ("numpy", "requests", "spotipy", "http.server")
+
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+loaded = [name for name in {heavy!r} if name in sys.modules]
+print(elapsed * 1000, ",".join(loaded))
+"""
+
+
+def run(args):
+    return subprocess.run([sys.executable, *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+
+
+def wall_ms(args):
+    started = time.perf_counter()
+    run(args)
+    return (time.perf_counter() - started) * 1000
+
+
+def measure(runs):
+    probe = IMPORT_PROBE.format(heavy=HEAVY_MODULES)
+    import_ms, loaded = [], set()
+    for _ in range(runs):
+        elapsed, _, modules = run(["-c", probe]).stdout.strip().partition(" ")
+        import_ms.append(float(elapsed))
+        loaded.update(filter(None, modules.split(",")))
+
+    bare = statistics.median(wall_ms(["-c", "pass"]) for _ in range(runs))
+    cli = statistics.median(wall_ms(["app.py", "--help"]) for _ in range(runs))
+    return {
+        "import_app_ms": statistics.median(import_ms),
+        "cli_overhead_ms": cli - bare,
+        "interpreter_ms": bare,
+        "heavy_modules_loaded": sorted(loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per measurement (median is used)")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--cli-budget-ms", type=float, default=CLI_BUDGET_MS)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(f"import app:       {result['import_app_ms']:7.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print(f"app.py --help:    {result['cli_overhead_ms']:7.1f} ms over a bare interpreter "
+          f"({result['interpreter_ms']:.1f} ms; budget {args.cli_budget_ms:.0f} ms)")
+
+    failures = []
+    if result["import_app_ms"] > args.import_budget_ms:
+        failures.append("import app is over budget")
+    if result["cli_overhead_ms"] > args.cli_budget_ms:
+        failures.append("app.py --help is over budget")
+    if result["heavy_modules_loaded"]:
+        failures.append(f"import app loaded {', '.join(result['heavy_modules_loaded'])}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("Startup within budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the OpenWeatherMap endpoints the app uses, serving the
+recorded observations in benchmarks/fixtures/weather_current.json:
+
+    /data/2.5/weather?q=<city>     current weather by name
+    /data/2.5/group?id=<id>,<id>   current weather for many city ids
+    /data/2.5/forecast?id=<id>     3-hourly forecast derived from the observation
+
+Cities that are not in the fixtures get a copy of the first record with a
+new id, so any number of cities can be exercised. Point the app at it with
+
+    python benchmarks/weather_stub.py --port 8099
+    WEATHER_BASE_URL=http://127.0.0.1:8099/data/2.5 python app.py
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from fakes import load_fixture
+
+FORECAST_STEP = 3 * 3600
+
+
+class WeatherStub:
+    """Fixture-backed responses plus per-endpoint request counts"""
+
+    def __init__(self):
+        self.by_name = {}
+        self.by_id = {}
+        for record in load_fixture("weather_current.json"):
+            self._add(record)
+        self.template = load_fixture("weather_current.json")[0]
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def _add(self, record):
+        self.by_name[record["name"].lower()] = record
+        self.by_id[record["id"]] = record
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def city(self, name):
+        with self._lock:
+            record = self.by_name.get(name.strip().lower())
+            if record is None:
+                record = copy.deepcopy(self.template)
+                record["name"] = name.strip().title()
+                record["id"] = 9_000_000 + len(self.by_id)
+                self._add(record)
+            return record
+
+    def current(self, query):
+        self._count("weather")
+        if "id" in query:
+            return self.by_id.get(int(query["id"]))
+        return self.city(query["q"])
+
+    def group(self, query):
+        self._count("group")
+        ids = [int(city_id) for city_id in query["id"].split(",") if city_id]
+        records = [self.by_id[city_id] for city_id in ids if city_id in self.by_id]
+        return {"cnt": len(records), "list": records}
+
+    def forecast(self, query):
+        self._count("forecast")
+        record = self.by_id.get(int(query["id"])) if "id" in query else self.city(query["q"])
+        if record is None:
+            return None
+        steps = int(query.get("cnt", 40))
+        start = int(time.time()) // FORECAST_STEP * FORECAST_STEP + FORECAST_STEP
+        entries = []
+        for step in range(steps):
+            entry = {key: copy.deepcopy(record[key]) for key in ("main", "weather", "clouds", "wind")}
+            entry["dt"] = start + step * FORECAST_STEP
+            # Drift the temperature over the day so forecasts are not flat
+            entry["main"]["temp"] = round(record["main"]["temp"] + 3 * ((step % 8) - 4) / 4, 1)
+            if "rain" in record:
+                entry["rain"] = {"3h": record["rain"].get("1h", 0) * 3}
+            entries.append(entry)
+        return {"cnt": len(entries), "list": entries, "city": {"id": record["id"], "name": record["name"]}}
+
+
+def make_server(stub, host="127.0.0.1", port=0):
+    routes = {"weather": stub.current, "group": stub.group, "forecast": stub.forecast}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            route = routes.get(url.path.rstrip("/").rsplit("/", 1)[-1])
+            body = route(query) if route else None
+            if body is None:
+                self.send_response(404)
+                payload = b'{"cod": "404", "message": "city not found"}'
+            else:
+                self.send_response(200)
+                payload = json.dumps(body).encode("utf-8")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    server = make_server(WeatherStub(), args.host, args.port)
+    print(f"OpenWeatherMap stand-in on http://{args.host}:{args.port}/data/2.5")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from scoring import DEFAULT_POPULARITY, FEATURE_NAMES
+
+# Default freshness windows (seconds)
+METADATA_TTL = 24 * 3600        # popularity drifts slowly
+FEATURES_TTL = 30 * 24 * 3600   # audio features practically never change
+QUERY_TTL = 6 * 3600            # search results / playlist contents
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tracks (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    artists TEXT NOT NULL,
+    album TEXT NOT NULL,
+    popularity INTEGER,
+    duration_ms INTEGER,
+    explicit INTEGER,
+    is_hindi INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audio_features (
+    id TEXT PRIMARY KEY,
+    {", ".join(f"{name} REAL" for name in FEATURE_NAMES)},
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queries (
+    source TEXT NOT NULL,
+    key TEXT NOT NULL,
+    track_ids TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (source, key)
+);
+"""
+
+
+class TrackCatalog:
+    """
+    On-disk catalog of tracks seen in searches and playlists, keyed by track id.
+    Stores compact metadata, the is_hindi_track verdict, audio features and the
+    track lists returned by each search query / playlist, each with a timestamp
+    so callers only go back to Spotify for what is missing or stale.
+    """
+
+    def __init__(self, path, metadata_ttl=METADATA_TTL, features_ttl=FEATURES_TTL, query_ttl=QUERY_TTL):
+        self.path = path
+        self.metadata_ttl = metadata_ttl
+        self.features_ttl = features_ttl
+        self.query_ttl = query_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Tracks
+
+    def put_tracks(self, tracks, classify=None):
+        """Insert or refresh track metadata; classify(track) supplies the Hindi verdict"""
+        now = time.time()
+        rows = []
+        for track in tracks:
+            if not track or not track.get("id"):
+                continue
+            verdict = track.get("is_hindi")
+            if verdict is None and classify is not None:
+                verdict = classify(track)
+            rows.append((
+                track["id"],
+                track.get("name", ""),
+                json.dumps([artist["name"] for artist in track.get("artists", [])]),
+                track.get("album", {}).get("name", ""),
+                track.get("popularity"),
+                track.get("duration_ms"),
+                int(bool(track.get("explicit", False))),
+                None if verdict is None else int(bool(verdict)),
+                now,
+            ))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def get_tracks(self, track_ids, max_age=None):
+        """Return {id: track} for fresh catalog entries, shaped like Spotify track objects"""
+        max_age = self.metadata_ttl if max_age is None else max_age
+        cutoff = time.time() - max_age
+        found = {}
+        with self._lock:
+            for chunk in _chunks(list(track_ids), 500):
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self._conn.execute(
+                    f"SELECT id, name, artists, album, popularity, duration_ms, explicit, is_hindi "
+                    f"FROM tracks WHERE id IN ({placeholders}) AND updated_at >= ?",
+                    (*chunk, cutoff),
+                )
+                for row in cursor:
+                    found[row[0]] = _track_from_row(row)
+        return found
+
+    # Audio features
+
+    def put_audio_features(self, features_list):
+        """Store audio feature dicts as returned by sp.audio_features"""
+        now = time.time()
+        rows = [
+            (features["id"], *[features.get(name) for name in FEATURE_NAMES], now)
+            for features in features_list
+            if features and features.get("id")
+        ]
+        placeholders = ",".join("?" * (len(FEATURE_NAMES) + 2))
+        with self._lock:
+            self._conn.executemany(f"INSERT OR REPLACE INTO audio_features VALUES ({placeholders})", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def get_audio_features(self, track_ids, max_age=None):
+        """Return {id: features} for fresh stored audio features"""
+        max_age = self.features_ttl if max_age is None else max_age
+        cutoff = time.time() - max_age
+        found = {}
+        columns = ", ".join(FEATURE_NAMES)
+        with self._lock:
+            for chunk in _chunks(list(track_ids), 500):
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self._conn.execute(
+                    f"SELECT id, {columns} FROM audio_features WHERE id IN ({placeholders}) AND fetched_at >= ?",
+                    (*chunk, cutoff),
+                )
+                for row in cursor:
+                    found[row[0]] = {"id": row[0], **dict(zip(FEATURE_NAMES, row[1:]))}
+        return found
+
+    def feature_matrix(self, hindi_only=False, max_age=None):
+        """
+        Every fresh audio-feature row as (track_ids, N x FEATURE_NAMES matrix,
+        popularity), optionally only tracks whose stored verdict is Hindi
+        """
+        max_age = self.features_ttl if max_age is None else max_age
+        columns = ", ".join(f"f.{name}" for name in FEATURE_NAMES)
+        query = (
+            f"SELECT f.id, {columns}, t.popularity FROM audio_features f "
+            f"{'JOIN' if hindi_only else 'LEFT JOIN'} tracks t ON t.id = f.id "
+            f"WHERE f.fetched_at >= ?{' AND t.is_hindi = 1' if hindi_only else ''}"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, (time.time() - max_age,)).fetchall()
+
+        track_ids = [row[0] for row in rows]
+        values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), len(FEATURE_NAMES) + 1)
+        popularity = np.nan_to_num(values[:, -1], nan=DEFAULT_POPULARITY)
+        return track_ids, values[:, :-1], popularity
+
+    def missing_audio_features(self, track_ids):
+        """Track ids whose audio features are absent or stale"""
+        known = self.get_audio_features(track_ids)
+        return [track_id for track_id in track_ids if track_id not in known]
+
+    # Search / playlist results
+
+    def put_query(self, source, key, tracks, classify=None):
+        """Remember which tracks a search query or playlist returned, plus their metadata"""
+        tracks = [track for track in tracks if track and track.get("id")]
+        self.put_tracks(tracks, classify)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)",
+                (source, key, json.dumps([track["id"] for track in tracks]), time.time()),
+            )
+            self._conn.commit()
+
+    def get_query(self, source, key, max_age=None):
+        """
+        Return the tracks a query produced last time, in order, or None when the
+        query result (or any of its tracks) is missing or stale
+        """
+        max_age = self.query_ttl if max_age is None else max_age
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT track_ids FROM queries WHERE source = ? AND key = ? AND fetched_at >= ?",
+                (source, key, time.time() - max_age),
+            ).fetchone()
+        if row is None:
+            return None
+
+        track_ids = json.loads(row[0])
+        tracks = self.get_tracks(track_ids)
+        if len(tracks) < len(track_ids):
+            return None
+        return [tracks[track_id] for track_id in track_ids]
+
+    def stats(self):
+        """Row counts per table"""
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("tracks", "audio_features", "queries")
+            }
+
+
+def _track_from_row(row):
+    track_id, name, artists, album, popularity, duration_ms, explicit, is_hindi = row
+    return {
+        "id": track_id,
+        "name": name,
+        "artists": [{"name": artist} for artist in json.loads(artists)],
+        "album": {"name": album},
+        "popularity": popularity,
+        "duration_ms": duration_ms,
+        "explicit": bool(explicit),
+        "is_hindi": None if is_hindi is None else bool(is_hindi),
+    }
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,141 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+
+def _compile_any(phrases):
+    """One regex that matches if any phrase occurs as a substring (case already folded)"""
+    phrases = sorted({phrase.lower() for phrase in phrases if phrase}, key=lambda phrase: (-len(phrase), phrase))
+    if not phrases:
+        return None
+    return re.compile("|".join(re.escape(phrase) for phrase in phrases))
+
+
+class HindiTrackClassifier:
+    """
+    Hindi track detection compiled once at startup.
+
+    Matching is the same as the original per-track scans (case-insensitive
+    substring tests on artist, track and album names), but artist names are
+    folded into a set for the exact-match fast path, every keyword list is a
+    single compiled regex, and verdicts are kept in an LRU cache keyed by
+    track id.
+    """
+
+    def __init__(self, artists, track_keywords, album_keywords, cache_size=100_000):
+        self.artist_set = frozenset(artist.lower() for artist in artists)
+        self._artist_re = _compile_any(artists)
+        self._track_re = _compile_any(track_keywords)
+        self._album_re = _compile_any(album_keywords)
+        # Saved verdicts are only reused by a classifier with the same rules
+        patterns = [regex.pattern if regex else "" for regex in (self._artist_re, self._track_re, self._album_re)]
+        self.rules_fingerprint = zlib.crc32("\n".join(sorted(self.artist_set) + patterns).encode("utf-8"))
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _matches(self, track):
+        for artist in track.get("artists", []):
+            name = (artist.get("name") or "").lower()
+            if name in self.artist_set:
+                return True
+            if self._artist_re and self._artist_re.search(name):
+                return True
+
+        track_name = (track.get("name") or "").lower()
+        if self._track_re and self._track_re.search(track_name):
+            return True
+
+        album_name = ((track.get("album") or {}).get("name") or "").lower()
+        if self._album_re and self._album_re.search(album_name):
+            return True
+
+        return False
+
+    def classify(self, track):
+        """Return True if the track looks like a Hindi/Bollywood track"""
+        if not track:
+            return False
+
+        track_id = track.get("id")
+        if track_id is None:
+            return self._matches(track)
+
+        with self._lock:
+            verdict = self._cache.get(track_id)
+            if verdict is not None:
+                self._cache.move_to_end(track_id)
+                self.hits += 1
+                return verdict
+
+        verdict = self._matches(track)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[track_id] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verdict
+
+    def classify_many(self, tracks):
+        """Classify a list of tracks in one call; returns a list of booleans aligned with the input"""
+        verdicts = [None] * len(tracks)
+        pending = []
+        hits = 0
+
+        with self._lock:
+            for i, track in enumerate(tracks):
+                if not track:
+                    verdicts[i] = False
+                    continue
+                cached = self._cache.get(track.get("id")) if track.get("id") is not None else None
+                if cached is not None:
+                    self._cache.move_to_end(track["id"])
+                    verdicts[i] = cached
+                    hits += 1
+                else:
+                    pending.append(i)
+            self.hits += hits
+
+        for i in pending:
+            verdicts[i] = self._matches(tracks[i])
+
+        with self._lock:
+            self.misses += len(pending)
+            for i in pending:
+                track_id = tracks[i].get("id")
+                if track_id is not None:
+                    self._cache[track_id] = verdicts[i]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return verdicts
+
+    def export_state(self):
+        """Cached verdicts, oldest first, as track ids plus a "1"/"0" string, for a warm-restart snapshot"""
+        with self._lock:
+            ids = list(self._cache)
+            verdicts = "".join("1" if self._cache[track_id] else "0" for track_id in ids)
+        return {"rules": self.rules_fingerprint, "ids": ids, "verdicts": verdicts}
+
+    def restore_state(self, state, elapsed=0):
+        """Load verdicts saved by export_state() if the rules are unchanged; returns how many"""
+        if state.get("rules") != self.rules_fingerprint:
+            return 0
+        ids = state["ids"][-self.cache_size:]
+        verdicts = state["verdicts"][-self.cache_size:]
+        restored = OrderedDict(zip(ids, map("1".__eq__, verdicts)))
+        with self._lock:
+            # Verdicts made since startup are the most recent
+            restored.update(self._cache)
+            self._cache = restored
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return len(ids)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
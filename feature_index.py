@@ -0,0 +1,142 @@
+import heapq
+
+import numpy as np
+
+from scoring import DEFAULT_POPULARITY, FEATURE_NAMES, mood_vectors, score_tracks, top_k
+
+# Points per leaf; leaves are scanned with one vectorized distance computation
+LEAF_SIZE = 64
+
+# Candidates fetched per requested result before exact re-scoring
+OVERSAMPLE = 4
+
+
+class FeatureIndex:
+    """
+    KD-tree over audio-feature vectors (FEATURE_NAMES order) for "tracks closest
+    to this mood" queries.
+
+    The tree is built once in raw feature space; each query supplies per-feature
+    scales (the mood's weight / range²), and since the distance stays a weighted
+    sum over axes, the same tree prunes correctly for every mood. Points are
+    stored leaf-contiguous so a leaf is a slice, and each node keeps its bounding
+    box for tight lower bounds. nearest() uses the tree to shortlist candidates
+    and re-ranks them with score_tracks, the scorer used everywhere else.
+    """
+
+    def __init__(self, track_ids, matrix, popularity=None, leaf_size=LEAF_SIZE):
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+        if popularity is None:
+            popularity = np.full(len(matrix), float(DEFAULT_POPULARITY))
+        popularity = np.asarray(popularity, dtype=np.float64)
+
+        # Tracks with incomplete features cannot be placed in the tree
+        complete = ~np.isnan(matrix).any(axis=1)
+        order = self._build(matrix[complete], leaf_size)
+        self.points = matrix[complete][order]
+        self.popularity = popularity[complete][order]
+        self.track_ids = np.asarray(track_ids, dtype=object)[complete][order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, points, leaf_size):
+        """Build nodes as parallel lists; returns the leaf-contiguous point order"""
+        order = np.arange(len(points))
+        # Split on the widest axis relative to its overall spread (tempo is in BPM)
+        spread = np.ptp(points, axis=0) if len(points) else np.ones(len(FEATURE_NAMES))
+        spread[spread <= 0] = 1.0
+
+        self.starts, self.ends = [], []
+        self.lower, self.upper = [], []
+        self.children = []
+
+        stack = [(0, len(points), None, None)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(self.starts)
+            if parent is not None:
+                self.children[parent][side] = node
+
+            block = points[order[start:end]]
+            self.starts.append(start)
+            self.ends.append(end)
+            self.lower.append(block.min(axis=0) if end > start else np.zeros(len(FEATURE_NAMES)))
+            self.upper.append(block.max(axis=0) if end > start else np.zeros(len(FEATURE_NAMES)))
+            self.children.append([None, None])
+
+            if end - start <= leaf_size:
+                continue
+            axis = int(np.argmax((self.upper[node] - self.lower[node]) / spread))
+            middle = (end - start) // 2
+            split = np.argpartition(block[:, axis], middle)
+            order[start:end] = order[start:end][split]
+            stack.append((start + middle, end, node, 1))
+            stack.append((start, start + middle, node, 0))
+
+        self.lower = np.array(self.lower)
+        self.upper = np.array(self.upper)
+        return order
+
+    def query(self, target, scale, k):
+        """
+        Indices and distances of the k points closest to target under
+        sum(scale * (x - target)²), closest first
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        target = np.asarray(target, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        best_index = np.empty(0, dtype=np.intp)
+        best_distance = np.empty(0)
+        bound = np.inf
+
+        heap = [(0.0, 0)]
+        while heap:
+            box_distance, node = heapq.heappop(heap)
+            if box_distance > bound:
+                break
+
+            left, right = self.children[node]
+            if left is None:
+                start, end = self.starts[node], self.ends[node]
+                delta = self.points[start:end] - target
+                distance = (delta * delta) @ scale
+                best_index = np.concatenate((best_index, np.arange(start, end)))
+                best_distance = np.concatenate((best_distance, distance))
+                if len(best_distance) > k:
+                    keep = np.argpartition(best_distance, k - 1)[:k]
+                    best_index, best_distance = best_index[keep], best_distance[keep]
+                if len(best_distance) == k:
+                    bound = best_distance.max()
+                continue
+
+            for child in (left, right):
+                gap = np.maximum(0.0, np.maximum(self.lower[child] - target, target - self.upper[child]))
+                child_distance = float((gap * gap) @ scale)
+                if child_distance <= bound:
+                    heapq.heappush(heap, (child_distance, child))
+
+        order = np.argsort(best_distance, kind="stable")
+        return best_index[order], best_distance[order]
+
+    def nearest(self, audio_targets, k, oversample=OVERSAMPLE):
+        """
+        Best k tracks for a mood's audio_features entry as (track_id, score),
+        best first: a tree shortlist of k * oversample, re-scored exactly
+        """
+        target, spread, weight = mood_vectors(audio_targets)
+        indices, _ = self.query(target, weight / (spread * spread), k * oversample)
+        if not len(indices):
+            return []
+        scores = score_tracks(self.points[indices], self.popularity[indices], audio_targets)
+        best = top_k(scores, k)
+        return [(self.track_ids[indices[i]], float(scores[i])) for i in best]
+
+    @classmethod
+    def from_catalog(cls, catalog, hindi_only=True, leaf_size=LEAF_SIZE):
+        """Index every catalog track with stored audio features (only Hindi-classified ones by default)"""
+        track_ids, matrix, popularity = catalog.feature_matrix(hindi_only=hindi_only)
+        return cls(track_ids, matrix, popularity, leaf_size)
@@ -0,0 +1,336 @@
+import contextlib
+import math
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import PlaylistJob
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    playlist_id TEXT PRIMARY KEY,
+    city TEXT NOT NULL,
+    interval INTEGER NOT NULL,
+    next_run REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    fence INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_next_run ON jobs (next_run);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+class LeaseLost(Exception):
+    """This worker no longer holds the job's lease, so it must not write the playlist"""
+
+
+class Lease:
+    """A claimed job; fence increases with every claim, so an older holder's lease is recognizably stale"""
+
+    __slots__ = ("job", "fence", "expires", "started")
+
+    def __init__(self, job, fence, expires):
+        self.job = job
+        self.fence = fence
+        self.expires = expires
+        self.started = time.time()
+
+
+class LeaseStore:
+    """
+    Playlist jobs and their leases in one SQLite file shared by every worker.
+
+    A worker claims due jobs by writing itself as the owner with a lease
+    expiry and a bumped fence number, inside one IMMEDIATE transaction, so two
+    workers can never claim the same job. Leases are renewed with the worker's
+    heartbeat; a worker that dies stops renewing and its jobs become claimable
+    again once the lease runs out. Completing a job only counts if the lease
+    (owner and fence) is still the worker's. Times are unix times, so hosts
+    sharing the file need roughly synchronized clocks; SQLite over a network
+    file system is not reliable, so for several hosts put the file on storage
+    with working locks.
+    """
+
+    def __init__(self, path, lease_seconds=60):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def add_jobs(self, jobs, delay=None, now=None):
+        """
+        Register jobs. Without a delay, new jobs are due immediately and existing
+        ones keep their schedule; with one, every given job is due `delay`
+        seconds from now. Leases are left alone either way.
+        """
+        now = time.time() if now is None else now
+        next_run = now if delay is None else now + delay
+        on_conflict = "" if delay is None else ", next_run = excluded.next_run"
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (playlist_id, city, interval, next_run) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT (playlist_id) DO UPDATE SET city = excluded.city, interval = excluded.interval{on_conflict}",
+                [(job.playlist_id, job.city, job.interval, next_run) for job in jobs],
+            )
+
+    def set_jobs(self, jobs, now=None):
+        """
+        Make the job table exactly `jobs`: add_jobs() them and retire every other
+        job. A retired job that is running loses its lease, so its worker does
+        not write it. Returns the retired playlist ids.
+        """
+        self.add_jobs(jobs, now=now)
+        wanted = {job.playlist_id for job in jobs}
+        with self._transaction() as conn:
+            retired = [playlist_id for (playlist_id,) in conn.execute("SELECT playlist_id FROM jobs")
+                       if playlist_id not in wanted]
+            conn.executemany("DELETE FROM jobs WHERE playlist_id = ?", [(playlist_id,) for playlist_id in retired])
+        return retired
+
+    def heartbeat(self, worker_id, now=None):
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers VALUES (?, ?)", (worker_id, now))
+            # Forget workers that have been silent for a long time
+            conn.execute("DELETE FROM workers WHERE heartbeat < ?", (now - 10 * self.lease_seconds,))
+
+    def claim(self, worker_id, limit, now=None):
+        """
+        Lease up to `limit` due jobs to worker_id, soonest first. Each worker
+        takes at most its fair share of what is due (due jobs / live workers,
+        rounded up), so a burst spreads across workers instead of going to
+        whoever polls first.
+        """
+        now = time.time() if now is None else now
+        if limit <= 0:
+            return []
+        with self._transaction() as conn:
+            claimable = "next_run <= ? AND (owner IS NULL OR lease_until < ?)"
+            due = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE {claimable}", (now, now)).fetchone()[0]
+            if not due:
+                return []
+            live = conn.execute("SELECT COUNT(*) FROM workers WHERE heartbeat >= ? AND id != ?",
+                                (now - self.lease_seconds, worker_id)).fetchone()[0] + 1
+            share = min(limit, math.ceil(due / live))
+            rows = conn.execute(
+                f"SELECT playlist_id, city, interval, fence FROM jobs WHERE {claimable} "
+                f"ORDER BY next_run LIMIT ?", (now, now, share),
+            ).fetchall()
+            expires = now + self.lease_seconds
+            conn.executemany(
+                "UPDATE jobs SET owner = ?, lease_until = ?, fence = ? WHERE playlist_id = ?",
+                [(worker_id, expires, fence + 1, playlist_id) for playlist_id, _, _, fence in rows],
+            )
+        return [Lease(PlaylistJob(city, playlist_id, interval), fence + 1, expires)
+                for playlist_id, city, interval, fence in rows]
+
+    def renew(self, worker_id, leases, now=None):
+        """Extend the given leases; returns the ones this worker no longer holds"""
+        now = time.time() if now is None else now
+        expires = now + self.lease_seconds
+        lost = []
+        with self._transaction() as conn:
+            for lease in leases:
+                cursor = conn.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE playlist_id = ? AND owner = ? AND fence = ? "
+                    "AND lease_until >= ?",
+                    (expires, lease.job.playlist_id, worker_id, lease.fence, now),
+                )
+                if cursor.rowcount:
+                    lease.expires = expires
+                else:
+                    lost.append(lease)
+        return lost
+
+    def holds(self, worker_id, lease, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE playlist_id = ? AND owner = ? AND fence = ? AND lease_until > ?",
+                (lease.job.playlist_id, worker_id, lease.fence, now),
+            ).fetchone()
+        return row is not None
+
+    def release(self, worker_id, lease, next_run):
+        """Give the job back with its next due time; False if the lease had already been lost"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET owner = NULL, lease_until = 0, next_run = ? "
+                "WHERE playlist_id = ? AND owner = ? AND fence = ?",
+                (next_run, lease.job.playlist_id, worker_id, lease.fence),
+            )
+        return cursor.rowcount == 1
+
+    def upcoming(self, within, now=None):
+        """(seconds until due, job) for jobs due in the next `within` seconds, soonest first"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT next_run, playlist_id, city, interval FROM jobs WHERE next_run <= ? ORDER BY next_run",
+                (now + within,),
+            ).fetchall()
+        return [(max(0.0, next_run - now), PlaylistJob(city, playlist_id, interval))
+                for next_run, playlist_id, city, interval in rows]
+
+    def next_claimable(self, now=None):
+        """Seconds until some job could be claimed (a job falls due or a lease runs out), or None"""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(MAX(next_run, CASE WHEN owner IS NULL THEN 0 ELSE lease_until END)) FROM jobs"
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+
+class LeaseWorker:
+    """
+    Runs playlist jobs claimed from a LeaseStore; any number of these, in one or
+    many processes on one or many hosts, share the job table.
+
+    Same interface as JobScheduler (add / run / stop / running / upcoming) so
+    the rest of the scheduler setup is unchanged. A heartbeat thread renews the
+    leases of running jobs every lease/3 seconds. Before writing, a job calls
+    check_lease(), which raises LeaseLost unless this worker still holds the
+    lease with at least `safety_margin` seconds left, so a worker that stalled
+    or lost its lease never writes a playlist another worker now owns.
+    """
+
+    def __init__(self, store, run_job, max_workers=4, worker_id=None, retry_delay=60, poll_interval=5,
+                 safety_margin=5):
+        self.store = store
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.worker_id = worker_id or f"worker-{id(self):x}"
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.safety_margin = safety_margin
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._local = threading.local()
+        self.stats = {"claimed": 0, "completed": 0, "failed": 0, "lost": 0}
+
+    def add(self, job, delay=0):
+        self.store.add_jobs([job], delay=delay)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def running(self):
+        with self._lock:
+            return len(self._leases)
+
+    def upcoming(self, within):
+        return self.store.upcoming(within)
+
+    def check_lease(self):
+        """Raise LeaseLost unless the calling job's lease is still safely held"""
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            return
+        if lease.expires - time.time() < self.safety_margin or not self.store.holds(self.worker_id, lease):
+            with self._lock:
+                self.stats["lost"] += 1
+            raise LeaseLost(f"Lease on playlist {lease.job.playlist_id} lost; not writing")
+
+    def _heartbeat_loop(self):
+        interval = max(1.0, self.store.lease_seconds / 3)
+        while not self._stopped.is_set():
+            try:
+                self.store.heartbeat(self.worker_id)
+                with self._lock:
+                    leases = list(self._leases.values())
+                for lease in self.store.renew(self.worker_id, leases):
+                    print(f"Lost the lease on playlist {lease.job.playlist_id}")
+            except sqlite3.Error as e:
+                print(f"Lease heartbeat failed: {e}")
+            self._stopped.wait(interval)
+
+    def _execute(self, lease):
+        self._local.lease = lease
+        try:
+            return self.run_job(lease.job)
+        finally:
+            self._local.lease = None
+
+    def _finished(self, lease, future):
+        try:
+            ok = bool(future.result())
+        except Exception as e:
+            print(f"Job for {lease.job.city} / {lease.job.playlist_id} crashed: {e}")
+            ok = False
+        delay = lease.job.interval if ok else min(self.retry_delay, lease.job.interval)
+        try:
+            released = self.store.release(self.worker_id, lease, lease.started + delay)
+        except sqlite3.Error as e:
+            print(f"Could not release the lease on playlist {lease.job.playlist_id}: {e}")
+            released = False
+        with self._lock:
+            self._leases.pop(lease.job.playlist_id, None)
+            self.stats["completed" if ok else "failed"] += 1
+            if not released:
+                self.stats["lost"] += 1
+        self._wake.set()
+
+    def run(self, once=False):
+        """
+        Claim and run jobs until stop(). With once, run what is due now and
+        return (succeeded, attempted) when nothing claimable is left.
+        """
+        self.store.heartbeat(self.worker_id)
+        threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True).start()
+        started = dict(self.stats)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job") as pool:
+                while not self._stopped.is_set():
+                    self._wake.clear()
+                    free = self.max_workers - self.running()
+                    claimed = []
+                    try:
+                        claimed = self.store.claim(self.worker_id, free)
+                    except sqlite3.Error as e:
+                        print(f"Claiming jobs failed: {e}")
+                    for lease in claimed:
+                        with self._lock:
+                            self._leases[lease.job.playlist_id] = lease
+                            self.stats["claimed"] += 1
+                        future = pool.submit(self._execute, lease)
+                        future.add_done_callback(lambda f, lease=lease: self._finished(lease, f))
+
+                    if once and not claimed and not self.running():
+                        break
+                    wait = self.poll_interval
+                    if free > len(claimed) and not once:
+                        until = self.store.next_claimable()
+                        if until is not None:
+                            wait = min(wait, max(until, 0.05))
+                    self._wake.wait(wait if not once else min(wait, 0.5))
+        finally:
+            self._stopped.set()
+        return (self.stats["completed"] - started["completed"],
+                self.stats["claimed"] - started["claimed"])
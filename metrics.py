@@ -0,0 +1,233 @@
+import contextlib
+import json
+import threading
+import time
+
+# Histogram buckets: stage latencies (seconds) and candidate pool sizes (tracks)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class CycleRecord:
+    """Stage timings and notes collected while one update cycle runs"""
+
+    def __init__(self, fields):
+        self.fields = dict(fields)
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    def add_stage(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms with labels.
+
+    stage() times a block into the stage latency histogram and, when the thread
+    is inside cycle(), into that cycle's record, which is printed as one JSON
+    line when the cycle ends. Collectors are called at scrape time to export
+    stats that other components already keep (cache hits, rate limiter waits).
+    render() produces the Prometheus text format and serve() exposes it on a
+    small local HTTP endpoint.
+    """
+
+    def __init__(self, namespace="weather_playlist"):
+        self.namespace = namespace
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collect):
+        """collect() returns (name, type, labels, value) samples, with type "counter" or "gauge" """
+        with self._lock:
+            self._collectors.append(collect)
+
+    # Stages and cycles
+
+    def record_stage(self, stage, seconds, error=False):
+        self.observe("stage_duration_seconds", seconds, stage=stage)
+        if error:
+            self.inc("stage_errors_total", stage=stage)
+        cycle = getattr(self._local, "cycle", None)
+        if cycle is not None:
+            cycle.add_stage(stage, seconds)
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """Time a pipeline stage"""
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record_stage(stage, time.perf_counter() - started, error)
+
+    def note(self, **fields):
+        """Attach fields to the current thread's cycle log line (no-op outside a cycle)"""
+        cycle = getattr(self._local, "cycle", None)
+        if cycle is not None:
+            cycle.fields.update(fields)
+
+    @contextlib.contextmanager
+    def cycle(self, **fields):
+        """
+        Collect one update cycle; on exit print its JSON log line and count it.
+        Set the cycle's outcome with note(status=...); an exception marks it "error".
+        """
+        previous = getattr(self._local, "cycle", None)
+        record = self._local.cycle = CycleRecord(fields)
+        try:
+            yield record
+        except BaseException as e:
+            record.fields.setdefault("status", "error")
+            record.fields.setdefault("error", str(e))
+            raise
+        finally:
+            self._local.cycle = previous
+            elapsed = time.perf_counter() - record.started
+            status = record.fields.setdefault("status", "ok")
+            self.observe("cycle_duration_seconds", elapsed)
+            self.inc("cycles_total", status=status)
+            line = {
+                "event": "cycle",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                **record.fields,
+                "duration_s": round(elapsed, 4),
+                "stages_s": {stage: round(seconds, 4) for stage, seconds in record.stages.items()},
+            }
+            print(json.dumps(line, default=str))
+
+    # Export
+
+    def _name(self, name):
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            collectors = list(self._collectors)
+
+        for collect in collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, labels, value in samples:
+                target = counters if kind == "counter" else gauges
+                target[self._key(name, labels)] = value
+
+        lines = []
+        for kind, samples in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in samples}):
+                full_name = self._name(name)
+                lines.append(f"# TYPE {full_name} {kind}")
+                for (sample_name, labels), value in sorted(samples.items()):
+                    if sample_name == name:
+                        lines.append(f"{full_name}{_labels(labels)} {_number(value)}")
+
+        for name in sorted({name for name, _ in histograms}):
+            full_name = self._name(name)
+            lines.append(f"# TYPE {full_name} histogram")
+            for (sample_name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f"{full_name}_bucket{_labels(labels + (('le', _number(bound)),))} {bucket_count}")
+                lines.append(f"{full_name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{full_name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{full_name}_count{_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve GET /metrics from a daemon thread; returns the server"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
@@ -0,0 +1,196 @@
+import random
+import threading
+import time
+import zlib
+
+
+def pool_key(mood_info):
+    """Moods with the same search keywords (e.g. mist / fog) share one pool"""
+    return tuple(mood_info["keywords"])
+
+
+class MoodPool:
+    def __init__(self, mood_info, track_ids):
+        self.mood_info = mood_info
+        self.track_ids = track_ids
+        self.built_at = time.monotonic()
+        self.last_used = self.built_at
+
+
+class MoodPoolStore:
+    """
+    Materialized ranked candidate pool per mood.
+
+    build(mood_info) runs the full search and ranking once per mood and returns
+    ranked track ids; every city and playlist with that mood then reads the
+    stored pool. A background thread rebuilds pools shortly before they expire
+    (only ones read within the last `idle_ttl` seconds), so updates rarely wait
+    on a build; a cold or expired pool is built on the spot, once, however many
+    callers ask for it at the same time.
+    """
+
+    def __init__(self, build, ttl=1800, refresh_ahead=0.2, idle_ttl=None):
+        self.build = build
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.idle_ttl = idle_ttl if idle_ttl is not None else 3 * ttl
+        self._pools = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"hits": 0, "builds": 0, "refreshes": 0, "prewarms": 0, "failures": 0}
+
+    def _fresh(self, pool, now):
+        return pool is not None and now - pool.built_at < self.ttl
+
+    def get(self, mood_info):
+        """Ranked track ids for the mood, building the pool if it is missing or expired"""
+        key = pool_key(mood_info)
+        with self._lock:
+            pool = self._pools.get(key)
+            now = time.monotonic()
+            if self._fresh(pool, now):
+                pool.last_used = now
+                self.stats["hits"] += 1
+                return pool.track_ids
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                pool = self._pools.get(key)
+                if self._fresh(pool, time.monotonic()):
+                    pool.last_used = time.monotonic()
+                    self.stats["hits"] += 1
+                    return pool.track_ids
+            return self._build(key, mood_info, "builds")
+
+    def warm(self, mood_info, needed_in=0):
+        """
+        Build the mood's pool ahead of use so it is still fresh `needed_in`
+        seconds from now; returns True if a build ran. Nothing is built when
+        needed_in is a full ttl or more away (the pool would expire first).
+        """
+        if needed_in >= self.ttl:
+            return False
+        key = pool_key(mood_info)
+        with self._lock:
+            pool = self._pools.get(key)
+            now = time.monotonic()
+            if self._fresh(pool, now + needed_in):
+                pool.last_used = now
+                return False
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                pool = self._pools.get(key)
+                if self._fresh(pool, time.monotonic() + needed_in):
+                    return False
+            self._build(key, mood_info, "prewarms")
+            return True
+
+    def _build(self, key, mood_info, counter):
+        track_ids = self.build(mood_info)
+        with self._lock:
+            if not track_ids:
+                # Keep serving the old pool (if any) rather than an empty one
+                self.stats["failures"] += 1
+                previous = self._pools.get(key)
+                return previous.track_ids if previous else []
+
+            previous = self._pools.get(key)
+            pool = self._pools[key] = MoodPool(mood_info, track_ids)
+            if previous is not None:
+                pool.last_used = previous.last_used
+            self.stats[counter] += 1
+            return track_ids
+
+    def refresh_due(self):
+        """Rebuild pools that are about to expire and were used recently; returns how many"""
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                (key, pool.mood_info)
+                for key, pool in self._pools.items()
+                if now - pool.built_at >= self.ttl * (1 - self.refresh_ahead)
+                and now - pool.last_used < self.idle_ttl
+            ]
+            idle = [key for key, pool in self._pools.items() if now - pool.last_used >= self.idle_ttl]
+            for key in idle:
+                del self._pools[key]
+
+        for key, mood_info in due:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                try:
+                    self._build(key, mood_info, "refreshes")
+                except Exception as e:
+                    print(f"Background refresh of the '{mood_info['mood']}' pool failed: {e}")
+                    with self._lock:
+                        self.stats["failures"] += 1
+        return len(due)
+
+    def start(self, check_interval=60):
+        """Refresh pools in a background thread until stop()"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(check_interval):
+                self.refresh_due()
+
+        self._thread = threading.Thread(target=loop, name="mood-pools", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def export_state(self):
+        """Pools with their ages, for a warm-restart snapshot"""
+        now = time.monotonic()
+        with self._lock:
+            return [{"mood_info": pool.mood_info, "track_ids": list(pool.track_ids), "age": now - pool.built_at}
+                    for pool in self._pools.values()]
+
+    def restore_state(self, entries, elapsed=0):
+        """
+        Load pools saved by export_state() `elapsed` seconds ago; pools that have
+        expired since, or that were built here already, are skipped. Returns how
+        many were restored.
+        """
+        now = time.monotonic()
+        restored = 0
+        with self._lock:
+            for entry in entries:
+                age = entry["age"] + elapsed
+                key = pool_key(entry["mood_info"])
+                if age >= self.ttl or not entry["track_ids"] or key in self._pools:
+                    continue
+                pool = self._pools[key] = MoodPool(entry["mood_info"], entry["track_ids"])
+                pool.built_at = now - age
+                restored += 1
+        return restored
+
+    def invalidate(self, mood_info=None):
+        with self._lock:
+            if mood_info is None:
+                self._pools.clear()
+            else:
+                self._pools.pop(pool_key(mood_info), None)
+
+
+def select_for_playlist(track_ids, limit, salt, window=5):
+    """
+    Pick `limit` tracks from a ranked pool with a light, per-playlist shuffle:
+    each track's rank is jittered by up to `window` places using a seed derived
+    from `salt` (the playlist id), so playlists sharing a mood differ a little
+    near the cut-off while one playlist gets the same picks every cycle until
+    the pool itself changes
+    """
+    if not salt or window <= 0:
+        return list(track_ids[:limit])
+    rng = random.Random(zlib.crc32(str(salt).encode("utf-8")))
+    jittered = sorted(range(len(track_ids)), key=lambda rank: rank + rng.uniform(0, window))
+    return [track_ids[rank] for rank in jittered[:limit]]
@@ -0,0 +1,166 @@
+import threading
+from operator import itemgetter
+
+# Weather "main" categories, in the priority order the fallback rules check them
+MAIN_NONE, MAIN_THUNDERSTORM, MAIN_SNOW, MAIN_RAIN, MAIN_DRIZZLE, MAIN_MIST, MAIN_CLOUDS, MAIN_CLEAR = range(8)
+
+_MAIN_PATTERNS = [
+    (MAIN_THUNDERSTORM, ("thunderstorm",)),
+    (MAIN_SNOW, ("snow",)),
+    (MAIN_RAIN, ("rain",)),
+    (MAIN_DRIZZLE, ("drizzle",)),
+    (MAIN_MIST, ("mist", "fog")),
+    (MAIN_CLOUDS, ("clouds",)),
+    (MAIN_CLEAR, ("clear",)),
+]
+
+NO_MATCH = -1
+
+
+class MoodResolver:
+    """
+    WEATHER_MOOD_MAP compiled into lookup tables.
+
+    Descriptions resolve through an exact-match table (filled on first sight of
+    each description with the same substring rule as before, so OpenWeatherMap's
+    small vocabulary is scanned once per process). Everything else - the
+    main-type, rain, cloud and temperature thresholds - is evaluated over whole
+    arrays, so a batch of observations becomes an array of mood ids in one call.
+    Mood ids index into `keys`.
+    """
+
+    def __init__(self, mood_map, hot_above=30, cold_below=10):
+        self.mood_map = mood_map
+        self.keys = list(mood_map)
+        self.ids = {key: i for i, key in enumerate(self.keys)}
+        self.hot_above = hot_above
+        self.cold_below = cold_below
+        self.default_id = self.ids["default"]
+        self._descriptions = {}
+        self._mains = {}
+        self._lock = threading.Lock()
+
+    def _id(self, key):
+        return self.ids.get(key, self.default_id)
+
+    def description_id(self, description):
+        """Mood id for an exact description, or NO_MATCH"""
+        found = self._descriptions.get(description)
+        if found is None:
+            found = NO_MATCH
+            for key in self.keys:
+                if key in description:
+                    found = self.ids[key]
+                    break
+            with self._lock:
+                self._descriptions[description] = found
+        return found
+
+    def main_category(self, main):
+        found = self._mains.get(main)
+        if found is None:
+            found = MAIN_NONE
+            for category, patterns in _MAIN_PATTERNS:
+                if any(pattern in main for pattern in patterns):
+                    found = category
+                    break
+            with self._lock:
+                self._mains[main] = found
+        return found
+
+    def resolve_columns(self, descriptions, mains, temperatures, clouds, rain):
+        """Resolve parallel columns of observations to an array of mood ids"""
+        # numpy is only needed for batches; single lookups (resolve) stay import-free
+        import numpy as np
+
+        # Fill the tables for unseen values once, then map every row with plain dict lookups
+        for description in set(descriptions):
+            self.description_id(description)
+        for main in set(mains):
+            self.main_category(main)
+        described = np.fromiter(map(self._descriptions.__getitem__, descriptions), dtype=np.int16, count=len(descriptions))
+        category = np.fromiter(map(self._mains.__getitem__, mains), dtype=np.int8, count=len(mains))
+        temp = np.asarray(temperatures, dtype=np.float64)
+        clouds = np.asarray(clouds, dtype=np.float64)
+        rain = np.asarray(rain, dtype=np.float64)
+
+        hot = temp > self.hot_above
+        cold = temp < self.cold_below
+        by_temperature = np.where(hot, self._id("hot"), np.where(cold, self._id("cold"), self.default_id))
+
+        conditions = [
+            described != NO_MATCH,
+            category == MAIN_THUNDERSTORM,
+            category == MAIN_SNOW,
+            category == MAIN_RAIN,
+            category == MAIN_DRIZZLE,
+            category == MAIN_MIST,
+            category == MAIN_CLOUDS,
+            category == MAIN_CLEAR,
+        ]
+        choices = [
+            described,
+            self._id("thunderstorm"),
+            np.where(rain > 1, self._id("snow"), self._id("light snow")),
+            np.where(rain > 7, self._id("heavy rain"),
+                     np.where(rain > 2.5, self._id("moderate rain"), self._id("light rain"))),
+            self._id("light rain"),
+            self._id("mist"),
+            np.where(clouds > 80, self._id("overcast clouds"),
+                     np.where(clouds > 50, self._id("broken clouds"), self._id("scattered clouds"))),
+            np.where(hot | cold, by_temperature,
+                     np.where(clouds < 10, self._id("clear sky"), self._id("few clouds"))),
+        ]
+        return np.select(conditions, choices, default=by_temperature).astype(np.int16)
+
+    def resolve_batch(self, records):
+        """Resolve a list of weather dicts (as returned by get_current_weather) to mood ids"""
+        records = list(records)
+        return self.resolve_columns(*(
+            list(map(itemgetter(field), records))
+            for field in ("description", "main", "temperature", "clouds", "rain")
+        ))
+
+    def resolve_id(self, description, main, temperature, clouds, rain):
+        """Scalar version of resolve_columns for one observation (no array overhead)"""
+        described = self.description_id(description)
+        if described != NO_MATCH:
+            return described
+
+        category = self.main_category(main)
+        if category == MAIN_THUNDERSTORM:
+            return self._id("thunderstorm")
+        if category == MAIN_SNOW:
+            return self._id("snow") if rain > 1 else self._id("light snow")
+        if category == MAIN_RAIN:
+            if rain > 7:
+                return self._id("heavy rain")
+            return self._id("moderate rain") if rain > 2.5 else self._id("light rain")
+        if category == MAIN_DRIZZLE:
+            return self._id("light rain")
+        if category == MAIN_MIST:
+            return self._id("mist")
+        if category == MAIN_CLOUDS:
+            if clouds > 80:
+                return self._id("overcast clouds")
+            return self._id("broken clouds") if clouds > 50 else self._id("scattered clouds")
+        if category == MAIN_CLEAR and not (temperature > self.hot_above or temperature < self.cold_below):
+            return self._id("clear sky") if clouds < 10 else self._id("few clouds")
+
+        if temperature > self.hot_above:
+            return self._id("hot")
+        if temperature < self.cold_below:
+            return self._id("cold")
+        return self.default_id
+
+    def resolve(self, record):
+        """Mood entry for a single weather dict; the default mood when record is None"""
+        if not record:
+            return self.mood_map["default"]
+        mood_id = self.resolve_id(record["description"], record["main"], record["temperature"],
+                                  record["clouds"], record["rain"])
+        return self.mood_map[self.keys[mood_id]]
+
+    def moods(self, mood_ids):
+        """Mood entries for an array of mood ids"""
+        return [self.mood_map[self.keys[int(mood_id)]] for mood_id in mood_ids]
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PlaylistEntry:
+    __slots__ = ("snapshot_id", "value", "checked_at")
+
+    def __init__(self, snapshot_id, value):
+        self.snapshot_id = snapshot_id
+        self.value = value
+        self.checked_at = time.monotonic()
+
+
+class PlaylistCache:
+    """
+    Parsed playlist reads keyed by the playlist's snapshot_id.
+
+    Spotify gives every playlist version a new snapshot_id, so a cached read
+    stays valid for as long as a cheap `fields=snapshot_id` lookup returns the
+    same id; only a changed playlist is downloaded again. Keys are tuples whose
+    second element is the playlist id (("items", playlist_id, ...),
+    ("state", playlist_id)). Entries checked within `check_interval` seconds
+    may be reused without asking again; that is meant for editorial playlists
+    that change rarely, not for ones other people edit.
+    """
+
+    def __init__(self, check_interval=0, max_entries=256):
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "checks": 0, "changed": 0}
+
+    def get(self, key):
+        """The cached entry for key, or None; does not check the snapshot"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def needs_check(self, entry):
+        return time.monotonic() - entry.checked_at >= self.check_interval
+
+    def validate(self, key, snapshot_id):
+        """
+        The entry for key if it was cached for snapshot_id (marking it checked
+        now); a stale entry is dropped and None returned
+        """
+        with self._lock:
+            self.stats["checks"] += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry.snapshot_id != snapshot_id:
+                del self._entries[key]
+                self.stats["changed"] += 1
+                self.stats["misses"] += 1
+                return None
+            entry.checked_at = time.monotonic()
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def miss(self):
+        """Count a read that found nothing cached"""
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def hit(self, entry):
+        """Count a reuse that skipped the snapshot check (within check_interval)"""
+        with self._lock:
+            self.stats["hits"] += 1
+        return entry
+
+    def store(self, key, snapshot_id, value):
+        if not snapshot_id:
+            return None
+        entry = PlaylistEntry(snapshot_id, value)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def export_state(self):
+        """
+        The playlist-state entries (track URIs of our own playlists by snapshot),
+        for a warm-restart snapshot; mined editorial pages are not saved
+        """
+        with self._lock:
+            return [[list(key), entry.snapshot_id, list(entry.value)]
+                    for key, entry in self._entries.items() if key[0] == "state"]
+
+    def restore_state(self, entries, elapsed=0):
+        """Load entries saved by export_state(); each is re-checked against its snapshot_id on first use"""
+        for key, snapshot_id, value in entries:
+            entry = self.store(tuple(key), snapshot_id, tuple(value))
+            if entry is not None:
+                entry.checked_at = float("-inf")
+        return len(entries)
+
+    def invalidate(self, playlist_id=None):
+        with self._lock:
+            if playlist_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[1] == playlist_id]:
+                    del self._entries[key]
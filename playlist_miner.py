@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Spotify's maximum page size for playlist items
+PAGE_SIZE = 100
+
+# Only what candidate ranking and the Hindi classifier read
+TRACK_FIELDS = "total,items(track(id,name,artists(name),album(name),popularity,duration_ms))"
+
+
+class CachedPages:
+    """The pages of one playlist version fetched so far, as stored in a PlaylistCache"""
+
+    def __init__(self):
+        self.pages = []
+        self.next_offset = 0
+        self.complete = False
+        self.lock = threading.Lock()
+
+    def add(self, offset, tracks, next_offset, complete):
+        # Two readers may page the same playlist at once; the first to reach an offset stores it
+        with self.lock:
+            if self.next_offset == offset and not self.complete:
+                self.pages.append(tracks)
+                self.next_offset = next_offset
+                self.complete = complete
+
+
+def _cached_pages(sp, playlist_id, fields, market, cache):
+    """
+    (CachedPages, first raw page or None) for a playlist. A cached version is
+    reused after a snapshot_id check (skipped within the cache's check_interval);
+    otherwise one request fetches the snapshot id together with the first page.
+    """
+    key = ("items", playlist_id, fields, market)
+    entry = cache.get(key)
+    if entry is not None:
+        if not cache.needs_check(entry):
+            return cache.hit(entry).value, None
+        snapshot_id = sp.playlist(playlist_id, fields="snapshot_id").get("snapshot_id")
+        entry = cache.validate(key, snapshot_id)
+        if entry is not None:
+            return entry.value, None
+    else:
+        cache.miss()
+
+    playlist = sp.playlist(playlist_id, fields=f"snapshot_id,tracks({fields})", market=market,
+                           additional_types=("track",))
+    pages = CachedPages()
+    if cache.store(key, playlist.get("snapshot_id"), pages) is None:
+        pages = None
+    return pages, playlist.get("tracks") or {}
+
+
+def iter_playlist_pages(sp, playlist_id, fields=TRACK_FIELDS, page_size=PAGE_SIZE, market="IN", prefetch=True,
+                        cache=None):
+    """
+    Yield a playlist's tracks page by page (lists of track dicts, unavailable
+    items dropped). With prefetch, the next page is requested while the caller
+    is still working on the current one. Closing the generator early (break out
+    of the loop, or close()) stops paging; an in-flight prefetch is discarded.
+
+    With a PlaylistCache, pages already fetched for the playlist's current
+    snapshot are served from memory and only pages past them are requested.
+    """
+    def fetch(offset):
+        return sp.playlist_items(playlist_id, fields=fields, limit=page_size, offset=offset,
+                                 market=market, additional_types=("track",))
+
+    cached, page = _cached_pages(sp, playlist_id, fields, market, cache) if cache is not None else (None, None)
+    offset = 0
+    if cached is not None:
+        with cached.lock:
+            pages, offset, complete = list(cached.pages), cached.next_offset, cached.complete
+        yield from pages
+        if complete:
+            return
+
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist-miner") if prefetch else None
+    try:
+        if page is None:
+            page = fetch(offset)
+        total = page.get("total") or 0
+        while True:
+            items = page.get("items") or []
+            page_offset, offset = offset, offset + len(items)
+            more = bool(items) and offset < total
+
+            upcoming = pool.submit(fetch, offset) if more and pool else None
+            tracks = [item["track"] for item in items if item and item.get("track") and item["track"].get("id")]
+            if cached is not None:
+                cached.add(page_offset, tracks, offset, not more)
+            yield tracks
+
+            if not more:
+                return
+            page = upcoming.result() if upcoming else fetch(offset)
+    finally:
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_playlist_tracks(sp, playlist_id, **kwargs):
+    """Stream a playlist's tracks one at a time (see iter_playlist_pages)"""
+    pages = iter_playlist_pages(sp, playlist_id, **kwargs)
+    try:
+        for page in pages:
+            yield from page
+    finally:
+        pages.close()
@@ -0,0 +1,226 @@
+from bisect import bisect_left
+
+# Spotify accepts at most 100 items per add/remove/replace request
+MAX_ITEMS_PER_REQUEST = 100
+
+PLAYLIST_FIELDS = "snapshot_id,name,description,tracks(items(track(id,uri)),next)"
+
+# Enough to tell whether a cached copy of the items is still current
+PLAYLIST_HEAD_FIELDS = "snapshot_id,name,description"
+
+
+def track_uri(track_id):
+    """Accept a bare track id or a full Spotify URI"""
+    return track_id if track_id.startswith("spotify:") else f"spotify:track:{track_id}"
+
+
+def read_playlist_state(sp, playlist_id, cache=None):
+    """
+    Read a playlist's snapshot id, name, description and item URIs in order.
+    With a PlaylistCache holding an earlier read, only the snapshot id, name and
+    description are requested, and the items are reused if the snapshot matches.
+    """
+    key = ("state", playlist_id)
+    if cache is not None:
+        if cache.get(key) is not None:
+            head = sp.playlist(playlist_id, fields=PLAYLIST_HEAD_FIELDS)
+            entry = cache.validate(key, head.get("snapshot_id"))
+            if entry is not None:
+                return {
+                    "snapshot_id": entry.snapshot_id,
+                    "name": head.get("name") or "",
+                    "description": head.get("description") or "",
+                    "uris": list(entry.value),
+                }
+        else:
+            cache.miss()
+
+    playlist = sp.playlist(playlist_id, fields=PLAYLIST_FIELDS)
+    uris = []
+    page = playlist["tracks"]
+    while page:
+        for item in page.get("items", []):
+            track = item.get("track") or {}
+            uris.append(track.get("uri") or f"spotify:track:{track.get('id')}")
+        page = sp.next(page) if page.get("next") else None
+
+    state = {
+        "snapshot_id": playlist.get("snapshot_id"),
+        "name": playlist.get("name") or "",
+        "description": playlist.get("description") or "",
+        "uris": uris,
+    }
+    if cache is not None:
+        cache.store(key, state["snapshot_id"], tuple(uris))
+    return state
+
+
+def _longest_increasing_subsequence(values):
+    """Indices of one longest strictly increasing subsequence of values"""
+    tails = []
+    tail_indices = []
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_indices.append(i)
+        else:
+            tails[k] = value
+            tail_indices[k] = i
+        previous[i] = tail_indices[k - 1] if k > 0 else -1
+
+    result = []
+    i = tail_indices[-1] if tail_indices else -1
+    while i != -1:
+        result.append(i)
+        i = previous[i]
+    return result[::-1]
+
+
+def plan_playlist_diff(current, desired):
+    """
+    Compute the edits that turn the `current` URI list into `desired`:
+
+    - removals: (uri, position) pairs for items not wanted or duplicated
+    - moves: (range_start, insert_before) reorders, only for kept items that are
+      out of order (everything on a longest increasing run stays put)
+    - inserts: (position, [uris]) runs of new items, in ascending position
+
+    Applying removals (highest position first), then moves, then inserts in
+    order yields exactly `desired`.
+    """
+    desired_index = {}
+    for i, uri in enumerate(desired):
+        desired_index.setdefault(uri, i)
+    desired = [uri for i, uri in enumerate(desired) if desired_index[uri] == i]
+
+    removals = []
+    kept = []
+    seen = set()
+    for position, uri in enumerate(current):
+        if uri in desired_index and uri not in seen:
+            kept.append(uri)
+            seen.add(uri)
+        else:
+            removals.append((uri, position))
+
+    # Keep the longest run already in the right relative order; move the rest
+    order = [desired_index[uri] for uri in kept]
+    stay = {kept[i] for i in _longest_increasing_subsequence(order)}
+    target = sorted(kept, key=desired_index.get)
+
+    moves = []
+    simulated = list(kept)
+    for k, uri in enumerate(target):
+        if uri in stay:
+            continue
+        start = simulated.index(uri)
+        insert_before = simulated.index(target[k - 1]) + 1 if k > 0 else 0
+        if insert_before in (start, start + 1):
+            continue
+        moves.append((start, insert_before))
+        simulated.pop(start)
+        simulated.insert(insert_before if insert_before < start else insert_before - 1, uri)
+
+    inserts = []
+    kept_set = set(kept)
+    run_start = None
+    for i, uri in enumerate(desired + [None]):
+        if uri is not None and uri not in kept_set:
+            if run_start is None:
+                run_start = i
+        elif run_start is not None:
+            inserts.append((run_start, desired[run_start:i]))
+            run_start = None
+
+    return {"removals": removals, "moves": moves, "inserts": inserts}
+
+
+def count_diff_requests(plan):
+    """Number of write requests needed to apply a plan"""
+    removal_requests = -(-len(plan["removals"]) // MAX_ITEMS_PER_REQUEST)
+    insert_requests = sum(-(-len(uris) // MAX_ITEMS_PER_REQUEST) for _, uris in plan["inserts"])
+    return removal_requests + len(plan["moves"]) + insert_requests
+
+
+def apply_playlist_diff(sp, playlist_id, plan, snapshot_id=None):
+    """Apply a plan from plan_playlist_diff, chaining snapshot ids; returns the final snapshot id"""
+    # Highest positions first so earlier positions stay valid between requests
+    removals = sorted(plan["removals"], key=lambda removal: removal[1], reverse=True)
+    for i in range(0, len(removals), MAX_ITEMS_PER_REQUEST):
+        by_uri = {}
+        for uri, position in removals[i:i + MAX_ITEMS_PER_REQUEST]:
+            by_uri.setdefault(uri, []).append(position)
+        items = [{"uri": uri, "positions": positions} for uri, positions in by_uri.items()]
+        result = sp.playlist_remove_specific_occurrences_of_items(playlist_id, items, snapshot_id=snapshot_id)
+        snapshot_id = result.get("snapshot_id", snapshot_id)
+
+    for range_start, insert_before in plan["moves"]:
+        result = sp.playlist_reorder_items(playlist_id, range_start=range_start,
+                                           insert_before=insert_before, snapshot_id=snapshot_id)
+        snapshot_id = result.get("snapshot_id", snapshot_id)
+
+    for position, uris in plan["inserts"]:
+        for i in range(0, len(uris), MAX_ITEMS_PER_REQUEST):
+            result = sp.playlist_add_items(playlist_id, uris[i:i + MAX_ITEMS_PER_REQUEST], position=position + i)
+            snapshot_id = result.get("snapshot_id", snapshot_id)
+
+    return snapshot_id
+
+
+def replace_playlist_items(sp, playlist_id, uris):
+    """Overwrite the playlist in as few requests as possible without emptying it first"""
+    result = sp.playlist_replace_items(playlist_id, uris[:MAX_ITEMS_PER_REQUEST])
+    snapshot_id = result.get("snapshot_id") if result else None
+    for i in range(MAX_ITEMS_PER_REQUEST, len(uris), MAX_ITEMS_PER_REQUEST):
+        result = sp.playlist_add_items(playlist_id, uris[i:i + MAX_ITEMS_PER_REQUEST])
+        snapshot_id = result.get("snapshot_id", snapshot_id) if result else snapshot_id
+    return snapshot_id
+
+
+def sync_playlist_items(sp, playlist_id, track_ids, state=None, mode="diff", max_extra_requests=5, cache=None):
+    """
+    Make the playlist contain exactly track_ids, in order.
+
+    In "diff" mode only the minimal removals / reorders / inserts are written.
+    Unchanged tracks keep their place (and added-at date); a full replace is used
+    only when the diff would cost more than `max_extra_requests` extra writes.
+    With a PlaylistCache, the written items are stored under the snapshot id the
+    last write returned, so the next read_playlist_state is a snapshot check.
+    Returns a summary dict with the strategy used and the number of write requests.
+    """
+    desired = [track_uri(track_id) for track_id in track_ids]
+
+    def written(snapshot_id, summary, uris=desired):
+        if cache is not None:
+            cache.store(("state", playlist_id), snapshot_id, tuple(uris))
+        return summary
+
+    if mode != "diff":
+        snapshot_id = replace_playlist_items(sp, playlist_id, desired)
+        return written(snapshot_id, {"strategy": "replace",
+                                     "requests": -(-max(len(desired), 1) // MAX_ITEMS_PER_REQUEST)})
+
+    if state is None:
+        state = read_playlist_state(sp, playlist_id, cache)
+
+    plan = plan_playlist_diff(state["uris"], desired)
+    diff_requests = count_diff_requests(plan)
+    replace_requests = -(-max(len(desired), 1) // MAX_ITEMS_PER_REQUEST)
+
+    if diff_requests == 0:
+        return {"strategy": "unchanged", "requests": 0}
+    if diff_requests > replace_requests + max_extra_requests:
+        snapshot_id = replace_playlist_items(sp, playlist_id, desired)
+        return written(snapshot_id, {"strategy": "replace", "requests": replace_requests})
+
+    snapshot_id = apply_playlist_diff(sp, playlist_id, plan, snapshot_id=state["snapshot_id"])
+    # The diff drops repeated tracks, so the playlist now holds each desired URI once
+    return written(snapshot_id, {
+        "strategy": "diff",
+        "requests": diff_requests,
+        "removed": len(plan["removals"]),
+        "moved": len(plan["moves"]),
+        "added": sum(len(uris) for _, uris in plan["inserts"]),
+    }, uris=dict.fromkeys(desired))
@@ -0,0 +1,117 @@
+import threading
+import time
+
+
+class Prewarmer:
+    """
+    Prepares scheduled playlist updates before they are due, while the
+    scheduler is idle.
+
+    Every pass looks at the jobs due within `horizon` seconds and, soonest
+    first: refreshes the forecast of their cities (at most every
+    `forecast_ttl` seconds per city), asks predict([(city, when), ...]) in one
+    call for the moods expected at each job's due time, and calls warm(mood_info, needed_in) so
+    those ranked pools exist and are still fresh when the job runs. Cities due
+    within `weather_lead` seconds get their current weather refreshed too.
+    When the job fires, its weather and pool lookups are cache hits and the
+    update is just the playlist write. Passes are skipped while any job is
+    running, so warming fills the gaps between update bursts instead of
+    adding to them.
+    """
+
+    def __init__(self, scheduler, predict, warm, refresh_forecast=None, refresh_weather=None,
+                 horizon=900, weather_lead=300, forecast_ttl=3 * 3600):
+        self.scheduler = scheduler
+        self.predict = predict
+        self.warm = warm
+        self.refresh_forecast = refresh_forecast
+        self.refresh_weather = refresh_weather
+        self.horizon = horizon
+        self.weather_lead = weather_lead
+        self.forecast_ttl = forecast_ttl
+        self._forecast_at = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"passes": 0, "skipped_busy": 0, "forecasts": 0, "moods_warmed": 0, "weather_refreshes": 0,
+                      "failures": 0}
+
+    def run_once(self):
+        """One warming pass; returns how many pools were built"""
+        if self.scheduler.running():
+            self.stats["skipped_busy"] += 1
+            return 0
+        upcoming = self.scheduler.upcoming(self.horizon)
+        self.stats["passes"] += 1
+        if not upcoming:
+            return 0
+
+        cities = list(dict.fromkeys(job.city for _, job in upcoming))
+        now = time.monotonic()
+        if self.refresh_forecast is not None:
+            stale = [city for city in cities if now - self._forecast_at.get(city.lower(), -self.forecast_ttl) >= self.forecast_ttl]
+            if stale:
+                self._call(self.refresh_forecast, stale)
+                self.stats["forecasts"] += len(stale)
+                for city in stale:
+                    self._forecast_at[city.lower()] = now
+
+        if self.refresh_weather is not None:
+            soon = list(dict.fromkeys(job.city for delay, job in upcoming if delay <= self.weather_lead))
+            if soon:
+                self._call(self.refresh_weather, soon)
+                self.stats["weather_refreshes"] += 1
+
+        built = 0
+        wall_now = time.time()
+        predictions = self.predict([(job.city, wall_now + delay) for delay, job in upcoming])
+        for (delay, _), moods in zip(upcoming, predictions):
+            if self._stop.is_set() or self.scheduler.running():
+                break
+            for mood_info in moods:
+                try:
+                    if self.warm(mood_info, delay):
+                        built += 1
+                except Exception as e:
+                    print(f"Pre-warming the '{mood_info['mood']}' pool failed: {e}")
+                    self.stats["failures"] += 1
+        self.stats["moods_warmed"] += built
+        return built
+
+    def _call(self, refresh, cities):
+        try:
+            refresh(cities)
+        except Exception as e:
+            print(f"Pre-warm refresh for {len(cities)} cities failed: {e}")
+            self.stats["failures"] += 1
+
+    def export_state(self):
+        """Ages of the per-city forecast refreshes, for a warm-restart snapshot"""
+        now = time.monotonic()
+        return {city: now - refreshed_at for city, refreshed_at in list(self._forecast_at.items())}
+
+    def restore_state(self, state, elapsed=0):
+        """Load forecast refresh ages saved by export_state() `elapsed` seconds ago"""
+        now = time.monotonic()
+        for city, age in state.items():
+            if age + elapsed < self.forecast_ttl:
+                self._forecast_at.setdefault(city, now - age - elapsed)
+        return len(self._forecast_at)
+
+    def start(self, check_interval=60):
+        """Run passes in a background thread until stop()"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(check_interval):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"Pre-warm pass failed: {e}")
+                    self.stats["failures"] += 1
+
+        self._thread = threading.Thread(target=loop, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
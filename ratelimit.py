@@ -0,0 +1,110 @@
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+
+def retry_after_seconds(error, default=1.0):
+    """Seconds to wait according to a 429 response's Retry-After header"""
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+# Request priorities, most urgent first
+PRIORITY_WRITE = 0    # playlist writes
+PRIORITY_READ = 1     # reads on our own account / playlists
+PRIORITY_MINING = 2   # searches, editorial playlist mining, audio features
+
+
+class PriorityRateLimiter:
+    """
+    Token bucket shared by every Spotify request in the process. When requests
+    queue up for tokens, lower priority numbers go first (FIFO within a
+    priority), so playlist writes are never stuck behind candidate mining.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {"requests": 0, "waited": 0, "wait_seconds": 0.0, "throttled": 0}
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self, priority=PRIORITY_READ):
+        """Block until this request may be sent"""
+        started = time.monotonic()
+        entry = [priority, next(self._counter)]
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            while True:
+                now = time.monotonic()
+                wait = None
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._waiters[0] is entry:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        heapq.heappop(self._waiters)
+                        self._cond.notify_all()
+                        break
+                    wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait)
+
+            waited = time.monotonic() - started
+            self.stats["requests"] += 1
+            if waited > 0.001:
+                self.stats["waited"] += 1
+                self.stats["wait_seconds"] += waited
+
+    def pause(self, seconds):
+        """Hold back every request for `seconds` (e.g. after a 429 with Retry-After)"""
+        with self._cond:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+            self.stats["throttled"] += 1
+            self._cond.notify_all()
+
+
+_scope = threading.local()
+
+
+@contextlib.contextmanager
+def priority_scope(priority):
+    """Raise the priority of every request made by this thread inside the block"""
+    previous = getattr(_scope, "priority", None)
+    _scope.priority = priority if previous is None else min(previous, priority)
+    try:
+        yield
+    finally:
+        _scope.priority = previous
+
+
+def request_priority(method, path):
+    """Priority for a Spotify Web API request (path relative to the API prefix)"""
+    if method != "GET":
+        priority = PRIORITY_WRITE
+    elif path.startswith(("me/", "users/")):
+        priority = PRIORITY_READ
+    else:
+        priority = PRIORITY_MINING
+
+    scoped = getattr(_scope, "priority", None)
+    return priority if scoped is None else min(priority, scoped)
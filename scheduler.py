@@ -0,0 +1,126 @@
+import csv
+import heapq
+import itertools
+import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# One playlist to keep in sync with one city's weather
+PlaylistJob = namedtuple("PlaylistJob", ["city", "playlist_id", "interval"])
+
+
+def load_jobs(path, default_interval=3600):
+    """
+    Load the job table from a JSON list of {"city", "playlist_id", "interval"}
+    objects, or from a CSV file with city,playlist_id[,interval] rows
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = [
+                dict(zip(("city", "playlist_id", "interval"), (cell.strip() for cell in row)))
+                for row in csv.reader(f)
+                if row and not row[0].startswith("#")
+            ]
+            if rows and rows[0].get("city", "").lower() == "city":
+                rows = rows[1:]
+
+    jobs = []
+    seen = set()
+    for row in rows:
+        city = row.get("city")
+        playlist_id = row.get("playlist_id")
+        if not city or not playlist_id:
+            print(f"Skipping incomplete job entry: {row}")
+            continue
+        if playlist_id in seen:
+            print(f"Skipping duplicate job for playlist {playlist_id}")
+            continue
+        seen.add(playlist_id)
+        jobs.append(PlaylistJob(city, playlist_id, int(row.get("interval") or default_interval)))
+    return jobs
+
+
+class JobScheduler:
+    """
+    Priority-queue timer for many playlist jobs in one process. Due jobs run on a
+    bounded worker pool; each job is re-queued only after its run finishes, so a
+    playlist is never updated by two workers at once.
+    """
+
+    def __init__(self, run_job, max_workers=4, retry_delay=60):
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.retry_delay = retry_delay
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._running = 0
+
+    def add(self, job, delay=0):
+        self._push(time.monotonic() + delay, job)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def running(self):
+        """Jobs currently executing"""
+        with self._cond:
+            return self._running
+
+    def upcoming(self, within):
+        """(seconds until due, job) for queued jobs due in the next `within` seconds, soonest first"""
+        now = time.monotonic()
+        with self._cond:
+            due = sorted((when, order, job) for when, order, job in self._queue if when - now <= within)
+        return [(max(0.0, when - now), job) for when, _, job in due]
+
+    def _push(self, when, job):
+        with self._cond:
+            heapq.heappush(self._queue, (when, next(self._counter), job))
+            self._cond.notify_all()
+
+    def _finished(self, job, started, future):
+        try:
+            ok = future.result()
+        except Exception as e:
+            print(f"Job for {job.city} / {job.playlist_id} crashed: {e}")
+            ok = False
+
+        delay = job.interval if ok else min(self.retry_delay, job.interval)
+        with self._cond:
+            self._running -= 1
+        self._push(started + delay, job)
+
+    def run(self):
+        """Run until stop() is called"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job") as pool:
+            while True:
+                with self._cond:
+                    while not self._stopped:
+                        if self._queue and self._running < self.max_workers:
+                            wait = self._queue[0][0] - time.monotonic()
+                            if wait <= 0:
+                                break
+                            self._cond.wait(wait)
+                        else:
+                            self._cond.wait()
+                    if self._stopped:
+                        break
+
+                    _, _, job = heapq.heappop(self._queue)
+                    self._running += 1
+
+                started = time.monotonic()
+                future = pool.submit(self.run_job, job)
+                future.add_done_callback(lambda f, job=job, started=started: self._finished(job, started, f))
@@ -0,0 +1,109 @@
+import numpy as np
+
+# Audio features used for mood matching, in feature-matrix column order
+FEATURE_NAMES = ("energy", "valence", "danceability", "tempo", "acousticness")
+
+# Fallbacks for features a mood entry does not list explicitly
+DEFAULT_RANGE = 0.2
+DEFAULT_WEIGHT = 0.2
+
+# Blend between audio-feature similarity and Spotify popularity
+SIMILARITY_WEIGHT = 0.7
+POPULARITY_WEIGHT = 0.3
+DEFAULT_POPULARITY = 50
+
+
+def mood_vectors(audio_targets):
+    """
+    Turn a mood's target_values / ranges / weights dicts into arrays
+    aligned with FEATURE_NAMES. Features without a target get zero weight.
+    """
+    target_values = audio_targets["target_values"]
+    ranges = audio_targets.get("ranges", {})
+    weights = audio_targets.get("weights", {})
+
+    target = np.array([target_values.get(name, np.nan) for name in FEATURE_NAMES], dtype=np.float64)
+    spread = np.array([ranges.get(name, DEFAULT_RANGE) for name in FEATURE_NAMES], dtype=np.float64)
+    weight = np.array([weights.get(name, DEFAULT_WEIGHT) for name in FEATURE_NAMES], dtype=np.float64)
+
+    missing = np.isnan(target)
+    target[missing] = 0.0
+    weight[missing] = 0.0
+    spread[spread <= 0] = DEFAULT_RANGE
+
+    return target, spread, weight
+
+
+def build_feature_matrix(features_list):
+    """
+    Build an (N x len(FEATURE_NAMES)) matrix and a popularity vector from a list
+    of audio feature dicts. Missing tracks or features become NaN.
+    """
+    rows = []
+    popularity = []
+    for features in features_list:
+        if features:
+            rows.append([features.get(name) for name in FEATURE_NAMES])
+            popularity.append(features.get("popularity", DEFAULT_POPULARITY))
+        else:
+            rows.append([None] * len(FEATURE_NAMES))
+            popularity.append(DEFAULT_POPULARITY)
+
+    matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURE_NAMES))
+    popularity = np.array(popularity, dtype=np.float64)
+    return matrix, popularity
+
+
+def score_tracks(matrix, popularity, audio_targets):
+    """
+    Score a whole candidate pool against a mood in one pass.
+
+    Each feature's distance from the target is divided by the mood's range for
+    that feature (so tempo in BPM and 0-1 features are comparable), turned into
+    a closeness in (0, 1], and averaged with the mood's weights. The result is
+    blended with popularity. Rows with no usable features score 0.
+    """
+    target, spread, weight = mood_vectors(audio_targets)
+
+    distance = (matrix - target) / spread
+    closeness = np.exp(-0.5 * distance * distance)
+
+    present = ~np.isnan(closeness)
+    closeness = np.where(present, closeness, 0.0)
+    used_weight = present @ weight
+
+    weighted = closeness @ weight
+    similarity = np.divide(weighted, used_weight, out=np.zeros_like(weighted), where=used_weight > 0)
+
+    popularity = np.nan_to_num(popularity, nan=DEFAULT_POPULARITY) / 100.0
+    scores = similarity * SIMILARITY_WEIGHT + popularity * POPULARITY_WEIGHT
+    scores[used_weight <= 0] = 0.0
+
+    return scores
+
+
+def top_k(scores, k):
+    """Return indices of the k best scores, best first (ties keep input order)"""
+    scores = np.asarray(scores)
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        # argpartition may keep any of the tracks tied with the k-th score; keep the earliest
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        better = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)[:k - len(better)]
+        candidates = np.concatenate((better, tied))
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def rank_pool(features_list, audio_targets, k):
+    """Score a list of audio feature dicts and select the top k; returns (indices, scores)"""
+    matrix, popularity = build_feature_matrix(features_list)
+    scores = score_tracks(matrix, popularity, audio_targets)
+    return top_k(scores, k), scores
@@ -0,0 +1,216 @@
+import threading
+import time
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import CacheFileHandler
+from spotipy.oauth2 import SpotifyOAuth
+from urllib3.util.retry import Retry
+
+from ratelimit import request_priority, retry_after_seconds
+
+SCOPE = "playlist-modify-public playlist-modify-private user-read-private"
+
+
+def endpoint_name(path):
+    """Collapse an API path to its endpoint, e.g. playlists/<id>/tracks -> playlists/tracks"""
+    segments = [segment for segment in path.split("?", 1)[0].split("/") if segment]
+    if len(segments) > 2:
+        segments = [segments[0], segments[-1]]
+    elif len(segments) == 2 and segments[0] not in ("me", "browse", "recommendations"):
+        segments = segments[:1]
+    return "/".join(segments)
+
+
+class MemoryBackedCacheHandler(CacheFileHandler):
+    """Token cache file that is read once and then served from memory"""
+
+    def __init__(self, cache_path):
+        super().__init__(cache_path=cache_path)
+        self._token_info = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get_cached_token(self):
+        with self._lock:
+            if not self._loaded:
+                self._token_info = super().get_cached_token()
+                self._loaded = True
+            return self._token_info
+
+    def save_token_to_cache(self, token_info):
+        with self._lock:
+            self._token_info = token_info
+            self._loaded = True
+        super().save_token_to_cache(token_info)
+
+
+class ManagedSpotify(spotipy.Spotify):
+    """
+    Spotify client that every API call in the app goes through. Each request
+    takes a token from the session's shared rate limiter (writes first), a 429
+    pauses all requests for Retry-After and is retried, and a 401 asks the
+    session to recover once.
+    """
+
+    def __init__(self, session, **kwargs):
+        super().__init__(**kwargs)
+        self.session = session
+
+    def _internal_call(self, method, url, payload, params):
+        limiter = self.session.limiter
+        path = url[len(self.prefix):] if url.startswith(self.prefix) else url
+        priority = request_priority(method, path)
+        endpoint = (method, endpoint_name(path))
+        throttled = 0
+
+        while True:
+            if limiter is not None:
+                limiter.acquire(priority)
+            self.session.count_request(endpoint)
+            try:
+                return self._call_with_auth_retry(method, url, payload, params)
+            except spotipy.SpotifyException as e:
+                if e.http_status != 429 or throttled >= self.session.max_throttle_retries:
+                    raise
+                throttled += 1
+                wait = retry_after_seconds(e)
+                print(f"Spotify rate limit hit, backing off {wait:.0f}s (attempt {throttled})")
+                if limiter is not None:
+                    limiter.pause(wait)
+                else:
+                    time.sleep(wait)
+
+    def _call_with_auth_retry(self, method, url, payload, params):
+        try:
+            return super()._internal_call(method, url, payload, dict(params))
+        except spotipy.SpotifyException as e:
+            if e.http_status != 401 or self.session.recovering:
+                raise
+            print("Spotify returned 401, refreshing the token and retrying once")
+            self.session.handle_unauthorized()
+            return super()._internal_call(method, url, payload, dict(params))
+
+
+class SpotifySession:
+    """
+    Long-lived Spotify client holder.
+
+    One OAuth manager, one token cache held in memory and one pooled HTTP
+    session are kept for the life of the process. get_client() refreshes the
+    token shortly before it expires instead of re-authenticating every cycle,
+    and a full reconnect only happens when a request actually gets a 401.
+    """
+
+    def __init__(self, client_id, client_secret, redirect_uri, scope=SCOPE,
+                 cache_path=".spotify_token_cache", refresh_margin=300, pool_size=20, requests_timeout=10,
+                 limiter=None, max_throttle_retries=5):
+        self.refresh_margin = refresh_margin
+        self.limiter = limiter
+        self.max_throttle_retries = max_throttle_retries
+        self.http = requests.Session()
+        # Transient 5xx errors are retried here; 429s are left to ManagedSpotify so
+        # one Retry-After pauses every request instead of just the one that got it
+        retry = Retry(total=3, status=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=False, respect_retry_after_header=False, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.http.mount("https://", adapter)
+
+        self.auth_manager = SpotifyOAuth(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri=redirect_uri,
+            scope=scope,
+            cache_handler=MemoryBackedCacheHandler(cache_path),
+            requests_session=self.http,
+            requests_timeout=requests_timeout,
+            open_browser=True  # Ensure this matches your environment
+        )
+        self.requests_timeout = requests_timeout
+        self.client = None
+        self.display_name = None
+        self.recovering = False
+        self._lock = threading.RLock()
+        self.stats = {
+            "connects": 0,
+            "refreshes": 0,
+            "unauthorized": 0,
+            "last_auth_seconds": None,
+            "total_auth_seconds": 0.0,
+        }
+        # Requests sent per (method, endpoint), retries included
+        self.api_calls = {}
+        self._calls_lock = threading.Lock()
+
+    def count_request(self, endpoint):
+        with self._calls_lock:
+            self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + 1
+
+    def _timed(self, key, action):
+        started = time.perf_counter()
+        try:
+            return action()
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats[key] += 1
+            self.stats["last_auth_seconds"] = elapsed
+            self.stats["total_auth_seconds"] += elapsed
+
+    def connect(self):
+        """Obtain a valid token, build the client and verify it once with current_user()"""
+        with self._lock:
+            def login():
+                token_info = self.auth_manager.validate_token(self.auth_manager.cache_handler.get_cached_token())
+                if not token_info:
+                    print("Getting new token...")
+                    self.auth_manager.get_access_token(as_dict=False)
+
+                client = ManagedSpotify(self, auth_manager=self.auth_manager, requests_session=self.http,
+                                        requests_timeout=self.requests_timeout)
+                user = client.current_user()
+                return client, user
+
+            self.client, user = self._timed("connects", login)
+            self.display_name = user.get("display_name")
+            return self.client
+
+    def expires_in(self):
+        """Seconds until the cached access token expires (None when there is no token)"""
+        token_info = self.auth_manager.cache_handler.get_cached_token()
+        if not token_info or "expires_at" not in token_info:
+            return None
+        return token_info["expires_at"] - time.time()
+
+    def refresh(self):
+        """Refresh the access token using the cached refresh token"""
+        with self._lock:
+            token_info = self.auth_manager.cache_handler.get_cached_token()
+            if not token_info or not token_info.get("refresh_token"):
+                return self.connect()
+            self._timed("refreshes", lambda: self.auth_manager.refresh_access_token(token_info["refresh_token"]))
+            return self.client
+
+    def get_client(self):
+        """Return the shared client, refreshing the token first if it is about to expire"""
+        with self._lock:
+            if self.client is None:
+                return self.connect()
+            remaining = self.expires_in()
+            if remaining is None or remaining < self.refresh_margin:
+                self.refresh()
+            return self.client
+
+    def handle_unauthorized(self):
+        """Recover from a 401: try a token refresh, reconnect if that fails"""
+        with self._lock:
+            self.stats["unauthorized"] += 1
+            self.recovering = True
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Token refresh failed ({e}), reconnecting")
+                self.client = None
+                self.connect()
+            finally:
+                self.recovering = False
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path, sections):
+    """
+    Write sections (JSON-able values by name) to path as zlib-compressed JSON.
+    The file is replaced atomically, so a crash mid-write keeps the previous
+    snapshot. Returns the number of bytes written.
+    """
+    payload = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "sections": sections}
+    data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 6)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_snapshot(path):
+    """(sections, seconds since the snapshot was saved), or (None, None) if there is no usable snapshot"""
+    try:
+        with open(path, "rb") as f:
+            payload = json.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return None, None
+    except (OSError, ValueError, zlib.error) as e:
+        print(f"Ignoring unreadable state snapshot {path}: {e}")
+        return None, None
+    if payload.get("version") != SNAPSHOT_VERSION:
+        return None, None
+    return payload["sections"], max(0.0, time.time() - payload["saved_at"])
+
+
+class StateSnapshotter:
+    """
+    Warm-restart snapshot of the process's caches and last-cycle state.
+
+    Components register an export function (returning JSON-able state with
+    ages relative to now, since monotonic timestamps do not survive a restart)
+    and a restore(state, elapsed) function. The snapshot file is read once, on
+    the first register(); each section is restored as soon as its component
+    registers, so a component restores before its first use. Each restore
+    applies its own TTL to the saved ages plus the time since the save, so a
+    quick restart serves from the restored state and a late one starts cold.
+    A background thread saves every `interval` seconds and whenever
+    request_save() is called; stop() saves a final time.
+    """
+
+    def __init__(self, path, interval=60):
+        self.path = path
+        self.interval = interval
+        self._exports = {}
+        self._loaded = None
+        self._elapsed = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"saves": 0, "restored_sections": 0, "failures": 0, "bytes": 0, "load_ms": 0.0}
+
+    def _load(self):
+        if self._loaded is None:
+            started = time.perf_counter()
+            sections, self._elapsed = load_snapshot(self.path)
+            self._loaded = sections or {}
+            self.stats["load_ms"] = (time.perf_counter() - started) * 1000
+            if sections:
+                print(f"Loaded state snapshot from {self._elapsed:.0f}s ago in {self.stats['load_ms']:.1f} ms")
+        return self._loaded
+
+    def register(self, name, export, restore=None):
+        """Include export()'s result in snapshots and restore the saved section, if any, right away"""
+        with self._lock:
+            self._exports[name] = export
+            state = self._load().pop(name, None)
+        if state is None or restore is None:
+            return None
+        try:
+            result = restore(state, self._elapsed)
+            self.stats["restored_sections"] += 1
+            return result
+        except Exception as e:
+            print(f"Could not restore '{name}' from the state snapshot: {e}")
+            self.stats["failures"] += 1
+            return None
+
+    def save(self):
+        """Write a snapshot now; returns the bytes written (0 on failure)"""
+        with self._lock:
+            exports = dict(self._exports)
+        try:
+            with self._save_lock:
+                size = save_snapshot(self.path, {name: export() for name, export in exports.items()})
+        except Exception as e:
+            print(f"Saving the state snapshot failed: {e}")
+            self.stats["failures"] += 1
+            return 0
+        self.stats["saves"] += 1
+        self.stats["bytes"] = size
+        return size
+
+    def request_save(self):
+        """Ask the background thread to save soon (e.g. after a playlist write)"""
+        self._wake.set()
+
+    def start(self):
+        """Save in a background thread until stop()"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                if not self._stop.is_set():
+                    self.save()
+
+        self._thread = threading.Thread(target=loop, name="state-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and save a final snapshot"""
+        self._stop.set()
+        self._wake.set()
+        if self._exports:
+            self.save()
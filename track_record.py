@@ -0,0 +1,165 @@
+import heapq
+import re
+import sys
+
+# Bracketed qualifiers ("(From \"Aashiqui 2\")", "[Lofi Flip]") and separators are
+# ignored when deciding whether two titles are the same song
+_BRACKETED = re.compile(r"[(\[].*?[)\]]")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def title_key(name):
+    """
+    Normalized title for near-duplicate detection: case-folded, bracketed
+    qualifiers and " - Remix" style suffixes dropped, punctuation collapsed
+    """
+    folded = name.casefold()
+    stripped = _BRACKETED.sub(" ", folded).split(" - ", 1)[0]
+    return " ".join(_NON_WORD.sub(" ", stripped).split()) or folded
+
+
+class TrackRecord:
+    """
+    The part of a Spotify track object that ranking and dedup read.
+
+    Candidates used to be held as the full track JSON (album art, markets,
+    external URLs, ...) until the end of ranking just to read the id. A
+    record keeps the id, name, artist names, popularity and duration in
+    slots, with artist names interned so the same artist across thousands of
+    candidates is one string; the raw item can be dropped once it is parsed.
+    """
+
+    __slots__ = ("id", "name", "artists", "popularity", "duration_ms", "score")
+
+    def __init__(self, id, name, artists=(), popularity=None, duration_ms=None, score=0.0):
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.popularity = popularity
+        self.duration_ms = duration_ms
+        self.score = score
+
+    @classmethod
+    def from_track(cls, track, score=0.0):
+        """Build a record from a track dict (API response or catalog row)"""
+        artists = tuple(
+            sys.intern(artist["name"]) for artist in track.get("artists") or () if artist and artist.get("name")
+        )
+        return cls(track["id"], track.get("name") or "", artists,
+                   track.get("popularity"), track.get("duration_ms"), score)
+
+    @property
+    def dedup_key(self):
+        """Versions of the same song (remixes, "From ..." re-releases) share a key"""
+        return title_key(self.name)
+
+    @property
+    def artist_key(self):
+        """The primary artist, which per-artist caps count against"""
+        return self.artists[0].casefold() if self.artists else None
+
+    def __repr__(self):
+        return f"TrackRecord({self.id!r}, {self.name!r}, score={self.score:.3f})"
+
+
+class TopTracks:
+    """
+    Streaming selection of the best `limit` TrackRecords.
+
+    Candidates are offered one at a time and only the current selection is
+    kept, in a min-heap keyed by (score, earlier arrival), so memory is
+    O(limit) however many candidates stream past. Constraints are applied on
+    arrival: near-duplicate titles keep only their best version, and at most
+    `max_per_artist` tracks per primary artist are kept (a better track from a
+    capped artist replaces that artist's weakest). Ties go to the earlier
+    candidate, like a stable sort. Because displaced tracks are forgotten, a
+    candidate that lost only to a track that is later displaced is not
+    reconsidered; the result is the greedy selection over what is kept.
+    """
+
+    def __init__(self, limit, max_per_artist=None, dedupe=True):
+        self.limit = limit
+        self.max_per_artist = max_per_artist or None
+        self.dedupe = dedupe
+        self._heap = []          # (score, -arrival, record); the root is the weakest kept
+        self._by_title = {}      # title key -> entry
+        self._by_artist = {}     # artist key -> [entries]
+        self._arrivals = 0
+        self.stats = {"offered": 0, "duplicates": 0, "artist_capped": 0}
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self):
+        return len(self._heap) >= self.limit
+
+    @property
+    def offered(self):
+        return self.stats["offered"]
+
+    def offer(self, record):
+        """Consider one candidate; returns True if it is part of the selection now"""
+        self.stats["offered"] += 1
+        if self.limit <= 0:
+            return False
+        self._arrivals += 1
+        entry = (record.score, -self._arrivals, record)
+        displaced = []
+
+        title = record.dedup_key if self.dedupe else None
+        rival = self._by_title.get(title) if title is not None else None
+        if rival is not None:
+            if rival >= entry:
+                self.stats["duplicates"] += 1
+                return False
+            displaced.append(rival)
+
+        artist = record.artist_key
+        if self.max_per_artist and artist is not None:
+            kept = [other for other in self._by_artist.get(artist, ()) if other is not rival]
+            if len(kept) >= self.max_per_artist:
+                weakest = min(kept)
+                if weakest >= entry:
+                    self.stats["artist_capped"] += 1
+                    return False
+                displaced.append(weakest)
+
+        if not displaced and self.full:
+            if self._heap[0] >= entry:
+                return False
+            displaced.append(self._heap[0])
+
+        if rival is not None:
+            self.stats["duplicates"] += 1
+        for other in displaced:
+            self._remove(other)
+        self._add(entry, title, artist)
+        return True
+
+    def _add(self, entry, title, artist):
+        heapq.heappush(self._heap, entry)
+        if title is not None:
+            self._by_title[title] = entry
+        if artist is not None:
+            self._by_artist.setdefault(artist, []).append(entry)
+
+    def _remove(self, entry):
+        self._heap.remove(entry)
+        heapq.heapify(self._heap)
+        record = entry[2]
+        if self.dedupe and self._by_title.get(record.dedup_key) is entry:
+            del self._by_title[record.dedup_key]
+        artist = record.artist_key
+        if artist is not None:
+            entries = self._by_artist[artist]
+            entries.remove(entry)
+            if not entries:
+                del self._by_artist[artist]
+
+    def best(self):
+        """The selected records, best first"""
+        return [record for _, _, record in sorted(self._heap, reverse=True)]
+
+    def track_ids(self):
+        return [record.id for record in self.best()]
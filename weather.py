@@ -0,0 +1,545 @@
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+OPENWEATHER_API = "https://api.openweathermap.org/data/2.5"
+OPENWEATHER_URL = f"{OPENWEATHER_API}/weather"
+
+# Numeric fields kept per observation, in WeatherTable column order
+WEATHER_FIELDS = ("temperature", "humidity", "wind_speed", "clouds", "rain")
+
+# The group endpoint accepts at most this many city ids per request
+GROUP_SIZE = 20
+
+# Forecast steps are 3 hours apart
+FORECAST_STEP = 3 * 3600
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+
+
+def parse_weather(data):
+    """Turn an OpenWeatherMap current-weather payload into the dict used by the app"""
+    return {
+        "description": data["weather"][0]["description"].lower(),
+        "main": data["weather"][0]["main"].lower(),
+        "temperature": data["main"]["temp"],
+        "humidity": data["main"]["humidity"],
+        "wind_speed": data["wind"]["speed"],
+        "clouds": data.get("clouds", {}).get("all", 0),
+        "rain": data.get("rain", {}).get("1h", 0) if "rain" in data else 0,
+        "time": datetime.now().hour,
+    }
+
+
+def make_session(pool_size=10):
+    """requests.Session with a connection pool sized for concurrent jobs"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class WeatherProvider:
+    """
+    Current-weather lookups with a per-city TTL cache.
+
+    - Fresh entries (younger than ttl) are served from memory.
+    - Stale entries (younger than stale_ttl) are served immediately while one
+      background refresh fetches a new value.
+    - Concurrent misses for the same city share one in-flight request.
+    """
+
+    def __init__(self, api_key, ttl=600, stale_ttl=3 * 3600, timeout=DEFAULT_TIMEOUT,
+                 session=None, base_url=OPENWEATHER_URL):
+        self.api_key = api_key
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.timeout = timeout
+        self.base_url = base_url
+        self.session = session or make_session()
+        self._cache = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "fetches": 0, "errors": 0}
+
+    def fetch(self, city):
+        """Fetch current weather for a city straight from the API (no caching)"""
+        params = {"q": city, "appid": self.api_key, "units": "metric"}
+        try:
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return parse_weather(response.json())
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            print(f"Error fetching weather: {e}")
+            return None
+
+    def get(self, city):
+        """Get current weather for a city, using the cache whenever possible"""
+        key = city.strip().lower()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry:
+                age = now - entry[0]
+                if age < self.ttl:
+                    self.stats["hits"] += 1
+                    return entry[1]
+                if age < self.stale_ttl:
+                    self.stats["stale_hits"] += 1
+                    if key not in self._in_flight:
+                        self._in_flight[key] = Future()
+                        threading.Thread(target=self._refresh, args=(key, city),
+                                         name=f"weather-{key}", daemon=True).start()
+                    return entry[1]
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                owner = False
+            else:
+                self.stats["misses"] += 1
+                future = self._in_flight[key] = Future()
+                owner = True
+
+        if owner:
+            return self._refresh(key, city)
+        return future.result()
+
+    def _refresh(self, key, city):
+        with self._lock:
+            self.stats["fetches"] += 1
+            future = self._in_flight[key]
+
+        value = None
+        try:
+            value = self.fetch(city)
+        finally:
+            with self._lock:
+                if value is not None:
+                    self._cache[key] = (time.monotonic(), value)
+                else:
+                    self.stats["errors"] += 1
+                    # Keep serving the last good value if there is one
+                    entry = self._cache.get(key)
+                    if entry and time.monotonic() - entry[0] < self.stale_ttl:
+                        value = entry[1]
+                del self._in_flight[key]
+            future.set_result(value)
+        return value
+
+    def export_state(self):
+        """Cached readings with their ages, for a warm-restart snapshot"""
+        now = time.monotonic()
+        with self._lock:
+            return {key: [now - fetched_at, value] for key, (fetched_at, value) in self._cache.items()}
+
+    def restore_state(self, state, elapsed=0):
+        """Load readings saved by export_state() `elapsed` seconds ago that are still within stale_ttl"""
+        now = time.monotonic()
+        restored = 0
+        with self._lock:
+            for key, (age, value) in state.items():
+                age += elapsed
+                if age < self.stale_ttl and key not in self._cache:
+                    self._cache[key] = (now - age, value)
+                    restored += 1
+        return restored
+
+    def invalidate(self, city=None):
+        with self._lock:
+            if city is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(city.strip().lower(), None)
+
+
+def observation_values(data):
+    """
+    (field values in WEATHER_FIELDS order, main, description) for one current or
+    forecast entry; rain is normalized to mm per hour
+    """
+    rain = data.get("rain") or {}
+    rain_per_hour = rain["1h"] if "1h" in rain else rain.get("3h", 0) / 3
+    values = (
+        data["main"]["temp"],
+        data["main"]["humidity"],
+        data["wind"]["speed"],
+        data.get("clouds", {}).get("all", 0),
+        rain_per_hour,
+    )
+    return values, data["weather"][0]["main"].lower(), data["weather"][0]["description"].lower()
+
+
+class WeatherTable:
+    """
+    Columnar weather store: one row per city, float32 arrays per field.
+
+    `current` holds the latest observation per city (fields x cities); the
+    forecast cube is fields x cities x time slots on a shared FORECAST_STEP
+    time axis. Conditions (main, description) are interned into small integer
+    codes, so hundreds of cities and two days of forecasts take a few hundred
+    kilobytes instead of one JSON payload per call.
+    """
+
+    def __init__(self, cities=16, slots=16):
+        self.rows = {}
+        self.names = []
+        self.city_ids = []
+        self.conditions = []
+        self._condition_codes = {}
+        self.current = np.full((len(WEATHER_FIELDS), cities), np.nan, dtype=np.float32)
+        self.current_condition = np.full(cities, -1, dtype=np.int16)
+        self.observed_at = np.zeros(cities)          # unix time of the observation
+        self.fetched_at = np.full(cities, -np.inf)   # time.monotonic() of the fetch
+        self.slots = np.empty(0, dtype=np.int64)     # forecast slot start times, sorted
+        self.forecast = np.full((len(WEATHER_FIELDS), cities, slots), np.nan, dtype=np.float32)
+        self.forecast_condition = np.full((cities, slots), -1, dtype=np.int16)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    # Layout
+
+    def _row(self, city, city_id=None):
+        key = city.strip().lower()
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.names)
+            self.names.append(city.strip())
+            self.city_ids.append(city_id)
+            if row >= self.current.shape[1]:
+                self._grow_cities(2 * self.current.shape[1])
+        elif city_id is not None:
+            self.city_ids[row] = city_id
+        return row
+
+    def _grow_cities(self, capacity):
+        extra = capacity - self.current.shape[1]
+        self.current = np.pad(self.current, ((0, 0), (0, extra)), constant_values=np.nan)
+        self.current_condition = np.pad(self.current_condition, (0, extra), constant_values=-1)
+        self.observed_at = np.pad(self.observed_at, (0, extra))
+        self.fetched_at = np.pad(self.fetched_at, (0, extra), constant_values=-np.inf)
+        self.forecast = np.pad(self.forecast, ((0, 0), (0, extra), (0, 0)), constant_values=np.nan)
+        self.forecast_condition = np.pad(self.forecast_condition, ((0, extra), (0, 0)), constant_values=-1)
+
+    def _slot_columns(self, timestamps):
+        """Column index for each forecast timestamp, adding new slots in time order"""
+        slots = np.asarray(timestamps, dtype=np.int64) // FORECAST_STEP * FORECAST_STEP
+        new = np.setdiff1d(slots, self.slots)
+        if len(new):
+            merged = np.union1d(self.slots, new)
+            positions = np.searchsorted(merged, self.slots)
+            width = max(len(merged), self.forecast.shape[2])
+            forecast = np.full(self.forecast.shape[:2] + (width,), np.nan, dtype=np.float32)
+            condition = np.full((self.forecast.shape[1], width), -1, dtype=np.int16)
+            forecast[:, :, positions] = self.forecast[:, :, :len(self.slots)]
+            condition[:, positions] = self.forecast_condition[:, :len(self.slots)]
+            self.forecast, self.forecast_condition, self.slots = forecast, condition, merged
+        return np.searchsorted(self.slots, slots)
+
+    def _condition(self, main, description):
+        code = self._condition_codes.get((main, description))
+        if code is None:
+            code = self._condition_codes[(main, description)] = len(self.conditions)
+            self.conditions.append((main, description))
+        return code
+
+    # Writes
+
+    def put_current(self, city, data, city_id=None):
+        """Store one current-weather payload"""
+        values, main, description = observation_values(data)
+        with self._lock:
+            row = self._row(city, city_id)
+            self.current[:, row] = values
+            self.current_condition[row] = self._condition(main, description)
+            self.observed_at[row] = data.get("dt", time.time())
+            self.fetched_at[row] = time.monotonic()
+        return row
+
+    def put_forecast(self, city, entries, city_id=None):
+        """Store a forecast's "list" entries for one city"""
+        if not entries:
+            return
+        parsed = [observation_values(entry) for entry in entries]
+        with self._lock:
+            row = self._row(city, city_id)
+            columns = self._slot_columns([entry["dt"] for entry in entries])
+            self.forecast[:, row, columns] = np.array([values for values, _, _ in parsed], dtype=np.float32).T
+            self.forecast_condition[row, columns] = [self._condition(main, description) for _, main, description in parsed]
+
+    def prune(self, before):
+        """Drop forecast slots that start before the unix time `before`"""
+        with self._lock:
+            keep = self.slots >= before // FORECAST_STEP * FORECAST_STEP
+            if keep.all():
+                return
+            drop = len(self.slots) - int(keep.sum())
+            self.forecast[:, :, :len(self.slots) - drop] = self.forecast[:, :, drop:len(self.slots)]
+            self.forecast[:, :, len(self.slots) - drop:] = np.nan
+            self.forecast_condition[:, :len(self.slots) - drop] = self.forecast_condition[:, drop:len(self.slots)]
+            self.forecast_condition[:, len(self.slots) - drop:] = -1
+            self.slots = self.slots[keep]
+
+    def add_city(self, city, city_id=None):
+        """Track a city (with its OpenWeatherMap id when known) before any data arrives"""
+        with self._lock:
+            return self._row(city, city_id)
+
+    def mark_stale(self, city=None):
+        """Make the next age() check see this city (default: every city) as never fetched"""
+        with self._lock:
+            if city is None:
+                self.fetched_at[:] = -np.inf
+            else:
+                row = self.rows.get(city.strip().lower())
+                if row is not None:
+                    self.fetched_at[row] = -np.inf
+
+    # Warm-restart snapshot
+
+    def export_state(self):
+        """
+        Cities, ids, current readings and forecasts as JSON-able columns; fetch
+        times are saved as ages since monotonic times do not survive a restart
+        """
+        now = time.monotonic()
+        with self._lock:
+            cities, slots = len(self.names), len(self.slots)
+            return {
+                "names": list(self.names),
+                "city_ids": list(self.city_ids),
+                "conditions": [list(condition) for condition in self.conditions],
+                "current": self.current[:, :cities].astype(float).round(3).tolist(),
+                "current_condition": self.current_condition[:cities].tolist(),
+                "observed_at": self.observed_at[:cities].tolist(),
+                "age": (now - self.fetched_at[:cities]).tolist(),
+                "slots": self.slots.tolist(),
+                "forecast": self.forecast[:, :cities, :slots].astype(float).round(3).tolist(),
+                "forecast_condition": self.forecast_condition[:cities, :slots].tolist(),
+            }
+
+    def restore_state(self, state, elapsed=0):
+        """
+        Load a table saved by export_state() `elapsed` seconds ago. Cities that
+        already have a current reading here keep it; restored readings keep
+        their original fetch age, so the provider's TTL decides whether they are
+        still fresh. Returns how many readings were restored.
+        """
+        now = time.monotonic()
+        restored = 0
+        with self._lock:
+            codes = [self._condition(main, description) for main, description in state["conditions"]]
+            columns = self._slot_columns(state["slots"]) if state["slots"] else None
+            current = np.array(state["current"], dtype=np.float32).reshape(len(WEATHER_FIELDS), len(state["names"]))
+            forecast = np.array(state["forecast"], dtype=np.float32).reshape(
+                len(WEATHER_FIELDS), len(state["names"]), len(state["slots"]))
+            for i, name in enumerate(state["names"]):
+                row = self._row(name, state["city_ids"][i])
+                condition = state["current_condition"][i]
+                if condition >= 0 and self.current_condition[row] < 0:
+                    self.current[:, row] = current[:, i]
+                    self.current_condition[row] = codes[condition]
+                    self.observed_at[row] = state["observed_at"][i]
+                    self.fetched_at[row] = now - (state["age"][i] + elapsed)
+                    restored += 1
+                if columns is not None and (self.forecast_condition[row, columns] < 0).all():
+                    self.forecast[:, row, columns] = forecast[:, i, :]
+                    self.forecast_condition[row, columns] = [codes[code] if code >= 0 else -1
+                                                             for code in state["forecast_condition"][i]]
+        self.prune(time.time() - FORECAST_STEP)
+        return restored
+
+    # Reads
+
+    def age(self, city):
+        """Seconds since the city's current weather was fetched (inf when never)"""
+        row = self.rows.get(city.strip().lower())
+        return np.inf if row is None else time.monotonic() - self.fetched_at[row]
+
+    def record(self, city):
+        """Current weather for a city in the app's weather dict shape, or None"""
+        with self._lock:
+            row = self.rows.get(city.strip().lower())
+            if row is None or self.current_condition[row] < 0:
+                return None
+            main, description = self.conditions[self.current_condition[row]]
+            values = self.current[:, row].tolist()
+        record = {"description": description, "main": main, "time": datetime.now().hour}
+        record.update((field, round(value, 2)) for field, value in zip(WEATHER_FIELDS, values))
+        return record
+
+    def current_columns(self, cities=None):
+        """
+        Current weather for many cities as parallel columns (the arguments of
+        MoodResolver.resolve_columns): descriptions, mains, temperatures, clouds, rain
+        """
+        with self._lock:
+            rows = [self.rows[city.strip().lower()] for city in cities] if cities is not None else list(range(len(self)))
+            codes = self.current_condition[rows]
+            values = self.current[:, rows]
+        mains = [self.conditions[code][0] if code >= 0 else "" for code in codes]
+        descriptions = [self.conditions[code][1] if code >= 0 else "" for code in codes]
+        fields = dict(zip(WEATHER_FIELDS, values))
+        return descriptions, mains, fields["temperature"], fields["clouds"], fields["rain"]
+
+    def forecast_columns(self, city, start=None, end=None):
+        """
+        (slot times, descriptions, mains, temperatures, clouds, rain) for a city's
+        forecast slots with start <= time < end
+        """
+        with self._lock:
+            row = self.rows.get(city.strip().lower())
+            if row is None:
+                return np.empty(0, dtype=np.int64), [], [], *(np.empty(0, dtype=np.float32),) * 3
+            selected = self.forecast_condition[row, :len(self.slots)] >= 0
+            if start is not None:
+                selected &= self.slots >= start
+            if end is not None:
+                selected &= self.slots < end
+            columns = np.flatnonzero(selected)
+            times = self.slots[columns]
+            codes = self.forecast_condition[row, columns]
+            values = self.forecast[:, row, columns]
+        mains = [self.conditions[code][0] for code in codes]
+        descriptions = [self.conditions[code][1] for code in codes]
+        fields = dict(zip(WEATHER_FIELDS, values))
+        return times, descriptions, mains, fields["temperature"], fields["clouds"], fields["rain"]
+
+
+class BulkWeatherProvider:
+    """
+    Weather for many cities with few requests, stored in a WeatherTable.
+
+    Each city's OpenWeatherMap id is resolved once (that first by-name lookup
+    also stores its current weather); after that, refresh() fetches the current
+    weather of up to GROUP_SIZE cities per request through the group endpoint,
+    and get() refreshes every stale tracked city in one pass, so a few hundred
+    cities take a handful of requests. refresh_forecast() ingests the 3-hourly
+    forecast (one request per city; the API has no bulk forecast).
+    """
+
+    def __init__(self, api_key, ttl=600, timeout=DEFAULT_TIMEOUT, session=None, base_url=OPENWEATHER_API,
+                 group_size=GROUP_SIZE, forecast_steps=16):
+        self.api_key = api_key
+        self.ttl = ttl
+        self.timeout = timeout
+        self.base_url = base_url.rstrip("/")
+        self.session = session or make_session()
+        self.group_size = group_size
+        self.forecast_steps = forecast_steps
+        self.table = WeatherTable()
+        self._refresh_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "fetches": 0, "group_requests": 0, "forecast_requests": 0,
+                      "errors": 0}
+
+    def add_city(self, city, city_id):
+        """Register a city's OpenWeatherMap id up front, skipping the by-name lookup"""
+        self.table.add_city(city, city_id)
+
+    def _request(self, endpoint, params):
+        params = dict(params, appid=self.api_key, units="metric")
+        response = self.session.get(f"{self.base_url}/{endpoint}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch(self, city):
+        """Fetch one city by name, storing its id and current weather; returns the weather dict"""
+        self.stats["fetches"] += 1
+        try:
+            data = self._request("weather", {"q": city})
+            self.table.put_current(city, data, city_id=data.get("id"))
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            self.stats["errors"] += 1
+            print(f"Error fetching weather for {city}: {e}")
+            return None
+        return self.table.record(city)
+
+    def refresh(self, cities=None, max_age=None):
+        """
+        Refresh current weather for `cities` (default: every tracked city) whose
+        data is older than max_age (default: ttl). Returns the number of requests made.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        requests_made = 0
+        with self._refresh_lock:
+            names = list(self.table.names) if cities is None else [city.strip() for city in cities]
+            stale = [city for city in dict.fromkeys(names) if self.table.age(city) >= max_age]
+
+            by_id = {}
+            for city in stale:
+                row = self.table.rows.get(city.lower())
+                city_id = self.table.city_ids[row] if row is not None else None
+                if city_id is None:
+                    # Unknown id: one by-name lookup, which stores current weather too
+                    requests_made += 1
+                    self.fetch(city)
+                else:
+                    by_id[city_id] = self.table.names[row]
+
+            ids = list(by_id)
+            for start in range(0, len(ids), self.group_size):
+                chunk = ids[start:start + self.group_size]
+                requests_made += 1
+                self.stats["group_requests"] += 1
+                try:
+                    data = self._request("group", {"id": ",".join(str(city_id) for city_id in chunk)})
+                    for entry in data.get("list", []):
+                        name = by_id.get(entry.get("id"), entry.get("name"))
+                        self.table.put_current(name, entry, city_id=entry.get("id"))
+                except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                    self.stats["errors"] += 1
+                    print(f"Error fetching weather for {len(chunk)} cities: {e}")
+        return requests_made
+
+    def refresh_forecast(self, cities=None):
+        """Ingest the next forecast_steps 3-hour forecast slots for each city; returns requests made"""
+        names = list(self.table.names) if cities is None else [city.strip() for city in cities]
+        requests_made = 0
+        for city in dict.fromkeys(names):
+            row = self.table.rows.get(city.lower())
+            city_id = self.table.city_ids[row] if row is not None else None
+            params = {"id": city_id} if city_id is not None else {"q": city}
+            params["cnt"] = self.forecast_steps
+            requests_made += 1
+            self.stats["forecast_requests"] += 1
+            try:
+                data = self._request("forecast", params)
+                self.table.put_forecast(city, data.get("list", []), city_id=data.get("city", {}).get("id", city_id))
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                self.stats["errors"] += 1
+                print(f"Error fetching forecast for {city}: {e}")
+        self.table.prune(time.time() - FORECAST_STEP)
+        return requests_made
+
+    def get(self, city):
+        """Current weather for a city; a stale or unknown city triggers one refresh of every stale city"""
+        if self.table.age(city) < self.ttl:
+            self.stats["hits"] += 1
+            return self.table.record(city)
+
+        self.stats["misses"] += 1
+        tracked = list(self.table.names)
+        if city.strip().lower() not in self.table.rows:
+            tracked.append(city)
+        self.refresh(tracked)
+        return self.table.record(city)
+
+    def export_state(self):
+        return self.table.export_state()
+
+    def restore_state(self, state, elapsed=0):
+        return self.table.restore_state(state, elapsed)
+
+    def invalidate(self, city=None):
+        """Mark cities stale so the next get() refetches them"""
+        self.table.mark_stale(city)